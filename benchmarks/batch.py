@@ -0,0 +1,47 @@
+"""Benchmark evaluating a large generated file.
+
+Writes a file of 200000 short expressions and runs it with the results
+written to a file, once flushing the output after every line and once
+in blocks, printing the rate and the peak memory use.  Run it from the
+project directory:
+
+    python benchmarks/batch.py
+
+"""
+
+import os
+import sys
+import time
+import shutil
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.pysc import Interpreter
+
+
+EXPRESSIONS = 200000
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        source = os.path.join(directory, 'batch.scm')
+        with open(source, 'w') as f:
+            for i in range(EXPRESSIONS // 2):
+                f.write('(* %d 1.5)\n"line %d"\n' % (i, i))
+        for flush in Interpreter.FLUSH_POLICIES:
+            with open(os.path.join(directory, 'out'), 'w') as outstream:
+                start = time.time()
+                Interpreter(outstream=outstream, flush=flush).load(source)
+                elapsed = time.time() - start
+            print "%-6s %.2f s  %6.0f expressions/s  peak %d MB" % (
+                flush, elapsed, EXPRESSIONS / elapsed,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
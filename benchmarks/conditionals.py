@@ -0,0 +1,72 @@
+"""Benchmark procedures dominated by conditionals.
+
+Times tree recursive fib, written with both if and cond, and fast-expt
+from SICP 1.2.4 on each evaluator.  Run it from the project directory:
+
+    python benchmarks/conditionals.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.environment import Environment, Builtins
+from pysc.machine import Machine
+from pysc.parser import Parser
+
+
+PROGRAM = """
+(define (fib-if n)
+  (if (< n 2)
+      n
+      (+ (fib-if (- n 1)) (fib-if (- n 2)))))
+
+(define (fib-cond n)
+  (cond ((= n 0) 0)
+        ((= n 1) 1)
+        (else (+ (fib-cond (- n 1))
+                 (fib-cond (- n 2))))))
+
+(define (square x) (* x x))
+
+(define (even? n)
+  (= (remainder n 2) 0))
+
+(define (fast-expt b n)
+  (cond ((= n 0) 1)
+        ((even? n) (square (fast-expt b (/ n 2))))
+        (else (* b (fast-expt b (- n 1))))))
+
+(define (repeat-expt k)
+  (if (= k 0)
+      0
+      (begin-expt k)))
+
+(define (begin-expt k)
+  (fast-expt 3 100)
+  (repeat-expt (- k 1)))
+"""
+
+CASES = ['(fib-if 20)', '(fib-cond 20)', '(repeat-expt 5000)']
+
+
+def run(label, evaluator):
+    for expr in Parser.from_string(PROGRAM):
+        evaluator.eval(expr)
+    for case in CASES:
+        expr, = Parser.from_string(case)
+        start = time.time()
+        evaluator.eval(expr)
+        print "%-8s %-20s %.2f s" % (label, case, time.time() - start)
+
+
+def main():
+    run('analyzer', Environment(namespace=Builtins.namespace()))
+    run('machine', Machine(Environment(namespace=Builtins.namespace())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare the analyzer and machine evaluation engines.
+
+Runs a few workloads on an Environment evaluating through analysis
+into closures, and on a Machine running compiled bytecode.  Run it
+from the project directory:
+
+    python benchmarks/engines.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.environment import Environment, Builtins
+from pysc.machine import Machine
+from pysc.parser import Parser
+
+
+PROGRAM = """
+(define (fib n)
+  (if (< n 2)
+      n
+      (+ (fib (- n 1)) (fib (- n 2)))))
+
+(define (loop i acc)
+  (if (= i 0)
+      acc
+      (loop (- i 1) (+ acc 1))))
+
+(define (sum n)
+  (if (= n 0)
+      0
+      (+ n (sum (- n 1)))))
+
+(define (sqrt x)
+  (define (good-enough? guess)
+    (< (abs (- (* guess guess) x)) 0.001))
+  (define (improve guess)
+    (/ (+ guess (/ x guess)) 2))
+  (define (sqrt-iter guess)
+    (if (good-enough? guess)
+        guess
+        (sqrt-iter (improve guess))))
+  (sqrt-iter 1.0))
+
+(define (sqrt-loop n)
+  (if (= n 0)
+      0
+      (begin-sqrt n)))
+
+(define (begin-sqrt n)
+  (sqrt 1000000.0)
+  (sqrt-loop (- n 1)))
+"""
+
+CASES = ['(fib 20)', '(loop 200000 0)', '(sum 2000)', '(sqrt-loop 5000)']
+
+
+def time_engine(evaluator):
+    for expr in Parser.from_string(PROGRAM):
+        evaluator.eval(expr)
+    times = []
+    for case in CASES:
+        expr, = Parser.from_string(case)
+        start = time.time()
+        evaluator.eval(expr)
+        times.append(time.time() - start)
+    return times
+
+
+def main():
+    # The analyzer needs a deeper Python stack for the sum case
+    sys.setrecursionlimit(20000)
+    analyzer = time_engine(Environment(namespace=Builtins.namespace()))
+    machine = time_engine(Machine(Environment(
+        namespace=Builtins.namespace())))
+
+    print "%-20s %10s %10s" % ('', 'analyzer', 'machine')
+    for case, a, m in zip(CASES, analyzer, machine):
+        print "%-20s %9.2fs %9.2fs" % (case, a, m)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark starting from an image instead of a prelude.
+
+Makes a prelude of 500 procedure definitions, and times evaluating it
+against loading an image saved after evaluating it once.  Run it from
+the project directory:
+
+    python benchmarks/image.py
+
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.pysc import Interpreter
+
+
+DEFINES = 500
+
+TEMPLATE = """
+(define (f%(i)d x y)
+  (define (helper z) (+ z %(i)d))
+  (cond ((= x 0) (helper y))
+        ((> x y) (f%(i)d (- x 1) (* y 2)))
+        (else (helper (- x y)))))
+(define table%(i)d (list %(i)d "entry" 'symbol 1/3))
+"""
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        prelude = os.path.join(directory, 'prelude.scm')
+        with open(prelude, 'w') as f:
+            for i in range(DEFINES):
+                f.write(TEMPLATE % {'i': i})
+        image = os.path.join(directory, 'prelude.image')
+
+        start = time.time()
+        interpreter = Interpreter(outstream=StringIO.StringIO())
+        interpreter.load(prelude)
+        print "%-20s %.3f s" % ('evaluate prelude', time.time() - start)
+        interpreter.save_image(image)
+
+        start = time.time()
+        interpreter = Interpreter(outstream=StringIO.StringIO())
+        interpreter.load_image(image)
+        print "%-20s %.3f s" % ('load image', time.time() - start)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
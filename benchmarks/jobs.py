@@ -0,0 +1,54 @@
+"""Benchmark running many files in worker processes.
+
+Writes 16 independent files, each computing a Fibonacci number the
+slow way, and times running them with 1, 2 and 4 workers.  Run it
+from the project directory:
+
+    python benchmarks/jobs.py
+
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.pysc import run_parallel
+
+
+FILES = 16
+
+SOURCE = """
+(define (fib n)
+  (if (< n 2)
+      n
+      (+ (fib (- n 1)) (fib (- n 2)))))
+(fib 20)
+"""
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        files = []
+        for i in range(FILES):
+            filename = os.path.join(directory, 'job%d.scm' % i)
+            with open(filename, 'w') as f:
+                f.write(SOURCE)
+            files.append(filename)
+        for jobs in (1, 2, 4):
+            outstream = StringIO.StringIO()
+            start = time.time()
+            failed = run_parallel(files, jobs, {}, outstream=outstream)
+            assert not failed
+            print "%d jobs  %.2f s" % (jobs, time.time() - start)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
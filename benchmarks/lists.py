@@ -0,0 +1,43 @@
+"""Benchmark the list builtins on long lists.
+
+Builds a list of one million elements and times length, append, map
+and reverse on it, with the Python recursion limit lowered so that
+the run fails unless the builtins are iterative.  Run it from the
+project directory:
+
+    python benchmarks/lists.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.environment import Environment, Builtins, make_list
+from pysc.parser import Parser
+
+
+LENGTH = 1000000
+
+CASES = ['(length items)', '(append items items)', '(map - items)',
+         '(map + items items)', '(reverse items)']
+
+
+def main():
+    env = Environment(namespace=Builtins.namespace())
+    start = time.time()
+    env.namespace['items'] = make_list(range(LENGTH))
+    print "%-24s %.2f s" % ('build', time.time() - start)
+
+    sys.setrecursionlimit(100)
+    for case in CASES:
+        expr, = Parser.from_string(case)
+        start = time.time()
+        env.eval(expr)
+        print "%-24s %.2f s" % (case, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark arithmetic on each kind of number.
+
+Runs the same summing loop over exact integers, inexact reals and
+exact rationals, and a loop of integer divisions, to show that
+integers and reals are not slowed down by the rationals.  Run it from
+the project directory:
+
+    python benchmarks/numeric.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.environment import Environment, Builtins
+from pysc.parser import Parser
+
+
+PROGRAM = """
+(define (sum-loop i step acc)
+  (if (= i 0)
+      acc
+      (sum-loop (- i 1) step (+ (* acc 1) step))))
+
+(define (halve-loop i acc)
+  (if (= i 0)
+      acc
+      (halve-loop (- i 1) (/ (* acc 2) 2))))
+"""
+
+CASES = ['(sum-loop 200000 3 0)', '(sum-loop 200000 0.5 0.0)',
+         '(halve-loop 200000 6)', '(sum-loop 200000 (/ 1 3) 0)']
+
+
+def main():
+    env = Environment(namespace=Builtins.namespace())
+    for expr in Parser.from_string(PROGRAM):
+        env.eval(expr)
+    for case in CASES:
+        expr, = Parser.from_string(case)
+        start = time.time()
+        result = env.eval(expr)
+        print "%-28s %.2f s  %s" % (case, time.time() - start, result)
+
+
+if __name__ == '__main__':
+    main()
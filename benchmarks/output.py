@@ -0,0 +1,51 @@
+"""Benchmark printing from Scheme.
+
+Runs a loop displaying 200000 lines of three values each, to an
+unbuffered file on /dev/null, the way output to a pipe behaves with
+python -u.  The output port writes each value as it comes when its
+buffer size is 0, which is what display used to do, and in blocks by
+default.  Run it from the project directory:
+
+    python benchmarks/output.py
+
+"""
+
+import os
+import sys
+import time
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.pysc import Interpreter
+
+
+PROGRAM = """
+(define (report i)
+  (if (= i 0)
+      0
+      (begin-report i)))
+
+(define (begin-report i)
+  (display "line ")
+  (display i)
+  (display " done")
+  (newline)
+  (report (- i 1)))
+
+(report 200000)
+"""
+
+
+def main():
+    for label, buffer_size in [('unbuffered', 0), ('buffered', 65536)]:
+        with open(os.devnull, 'w', 0) as outstream:
+            interpreter = Interpreter(StringIO.StringIO(PROGRAM), outstream,
+                                      flush='block', buffer_size=buffer_size)
+            start = time.time()
+            interpreter.run()
+            print "%-12s %.2f s" % (label, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
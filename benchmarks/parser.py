@@ -0,0 +1,64 @@
+"""Benchmark the parser on a large source file.
+
+Generates a few megabytes of Scheme source, with procedure
+definitions, comments, long string constants and data tables, and
+parses it both as a stream and with Parser.from_file().  Run it from
+the project directory:
+
+    python benchmarks/parser.py
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.parser import Parser
+
+
+CHUNK = """
+;; Definition number %(i)d
+(define (square-%(i)d x) (* x x))
+(define (sum-of-squares-%(i)d x y)
+  (+ (square-%(i)d x) (square-%(i)d y)))
+(define table-%(i)d (list 1 2 3 4 5 6 7 8 9 10 3.14159 2.71828))
+(display "%(text)s")
+"""
+
+SIZE = 4 * 1024 * 1024
+
+
+def generate(f):
+    written = 0
+    i = 0
+    text = 'lorem ipsum dolor sit amet ' * 40
+    while written < SIZE:
+        chunk = CHUNK % {'i': i, 'text': text}
+        f.write(chunk)
+        written += len(chunk)
+        i += 1
+    return written
+
+
+def report(label, size, expressions):
+    start = time.time()
+    count = sum(1 for _ in expressions)
+    elapsed = time.time() - start
+    print "%s: parsed %d expressions, %.1f MB in %.2f s (%.2f MB/s)" % (
+        label, count, size / 1e6, elapsed, size / 1e6 / elapsed)
+
+
+def main():
+    with tempfile.NamedTemporaryFile(suffix='.scm') as f:
+        size = generate(f)
+        f.flush()
+        with open(f.name) as source:
+            report('stream', size, Parser(source).expressions())
+        report('from_file', size, Parser.from_file(f.name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark a Monte Carlo estimate of pi with map and pmap.
+
+Runs the Cesaro test of SICP section 3.1.2, whether the gcd of two
+random integers is 1, in 32 batches of trials, and times mapping
+over the batches in this process and in 1, 2 and 4 workers.  Run it
+from the project directory:
+
+    python benchmarks/pmap.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.environment import Environment, Builtins
+from pysc.parallel import ParallelBuiltins
+from pysc.parser import Parser
+
+
+PRELUDE = """
+(define (gcd a b)
+  (if (= b 0)
+      a
+      (gcd b (remainder a b))))
+(define (cesaro-test)
+  (= (gcd (random 1000000) (random 1000000)) 1))
+(define (monte-carlo trials experiment)
+  (define (iter trials-remaining trials-passed)
+    (cond ((= trials-remaining 0)
+           (/ trials-passed trials))
+          ((experiment)
+           (iter (- trials-remaining 1) (+ trials-passed 1)))
+          (else
+           (iter (- trials-remaining 1) trials-passed))))
+  (iter trials 0))
+(define (batch n) (monte-carlo 2000 cesaro-test))
+(define batches (list 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16
+                      17 18 19 20 21 22 23 24 25 26 27 28 29 30 31 32))
+"""
+
+
+def run(env, source):
+    result = None
+    for expr in Parser.from_string(source):
+        result = env.eval(expr)
+    return result
+
+
+def main():
+    env = Environment(namespace=Builtins.namespace())
+    run(env, PRELUDE)
+    ParallelBuiltins.min_items = 1
+    start = time.time()
+    run(env, '(map batch batches)')
+    print "map      %.2f s" % (time.time() - start)
+    for jobs in (1, 2, 4):
+        ParallelBuiltins.jobs = jobs
+        start = time.time()
+        run(env, '(pmap batch batches)')
+        print "%d jobs   %.2f s" % (jobs, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
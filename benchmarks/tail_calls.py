@@ -0,0 +1,105 @@
+"""Benchmark tail call elimination.
+
+Runs a tail recursive loop of one million iterations, with the Python
+recursion limit lowered so that the run fails unless the loop runs in
+constant stack space.  The loop is timed with the TailCall markers
+returned by tail calls, and again with tail calls raising an exception
+caught by execute(), as they did before the markers, to compare the
+two.  Run it from the project directory:
+
+    python benchmarks/tail_calls.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc import environment
+from pysc.environment import Environment, Builtins, Procedure, Frame, \
+    ArityError, _UNASSIGNED
+from pysc.parser import Parser
+
+
+PROGRAM = """
+(define (loop i acc)
+  (if (= i 0)
+      acc
+      (loop (- i 1) (+ acc 1))))
+"""
+
+ITERATIONS = 1000000
+
+
+class RaisedTailCall(Exception):
+    def __init__(self, code, frame):
+        self.code = code
+        self.frame = frame
+
+
+def execute_raising(code, frame):
+    while True:
+        try:
+            return code(frame)
+        except RaisedTailCall as tc:
+            code = tc.code
+            frame = tc.frame
+
+
+def apply_raising(self, env, args, eliminate_tail_call=False):
+    # Procedure.apply, raising tail calls instead of returning them
+    if self.code is None:
+        if self.env is None:
+            self.env = env
+        self.code, self.defines = self.env._analyze_body(
+            self.parameters, self.function, self.scope, self.name)
+    if len(args) != len(self.parameters):
+        raise ArityError('expected %d arguments, got %d' %
+                         (len(self.parameters), len(args)))
+    if self.defines:
+        args = args + [_UNASSIGNED] * self.defines
+    frame = Frame(args, self.frame)
+    if eliminate_tail_call:
+        raise RaisedTailCall(self.code, frame)
+    return execute_raising(self.code, frame)
+
+
+def run():
+    """Return seconds taken by the loop in a new Environment."""
+
+    env = Environment(namespace=Builtins.namespace())
+    for expr in Parser.from_string(PROGRAM):
+        env.eval(expr)
+    expr, = Parser.from_string('(loop %d 0)' % ITERATIONS)
+
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(100)
+    try:
+        start = time.time()
+        result = env.eval(expr)
+        elapsed = time.time() - start
+    finally:
+        sys.setrecursionlimit(limit)
+    assert result == ITERATIONS
+    return elapsed
+
+
+def main():
+    for name in ('markers', 'exceptions'):
+        if name == 'exceptions':
+            saved = environment.execute, Procedure.apply
+            environment.execute = execute_raising
+            Procedure.apply = apply_raising
+        try:
+            elapsed = run()
+        finally:
+            if name == 'exceptions':
+                environment.execute, Procedure.apply = saved
+        print "%-10s %d tail calls in %.2f s (%.2f us per call)" % (
+            name, ITERATIONS, elapsed, elapsed / ITERATIONS * 1e6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark numeric kernels on lists against NumPy vectors.
+
+Computes a dot product and a scaled sum over 100000 numbers, once
+with procedures looping over lists in Scheme and once with the vector
+builtins.  Needs NumPy.  Run it from the project directory:
+
+    python benchmarks/vectors.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysc.environment import Environment, Builtins
+from pysc.parser import Parser
+
+
+PROGRAM = """
+(define (dot-loop xs ys acc)
+  (if (null? xs)
+      acc
+      (dot-loop (cdr xs) (cdr ys) (+ acc (* (car xs) (car ys))))))
+
+(define (scaled-sum-loop xs acc)
+  (if (null? xs)
+      acc
+      (scaled-sum-loop (cdr xs) (+ acc (* 2.5 (abs (car xs)))))))
+
+(define (double x) (* 2 x))
+"""
+
+SIZE = 100000
+
+CASES = ['(dot-loop items items 0)',
+         '(vector-dot vec vec)',
+         '(scaled-sum-loop items 0)',
+         '(vector-sum (* 2.5 (abs vec)))',
+         '(map double items)',
+         '(vector-map double vec)',
+         '(vector-map * vec vec)']
+
+
+def main():
+    env = Environment(namespace=Builtins.namespace())
+    if 'vector' not in env.namespace:
+        sys.exit('NumPy is needed for vectors')
+    for expr in Parser.from_string(PROGRAM):
+        env.eval(expr)
+    for expr in Parser.from_string(
+            '(define items (list %s)) (define vec (list->vector items))' %
+            ' '.join(str(i) for i in range(SIZE))):
+        env.eval(expr)
+
+    for case in CASES:
+        expr, = Parser.from_string(case)
+        start = time.time()
+        env.eval(expr)
+        print "%-32s %.4f s" % (case, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import os
+import errno
+import hashlib
+import marshal
+import tempfile
+from fractions import Fraction
+from environment import Expression
+from parser import Parser
+
+
+class ParseCache(object):
+
+    """Cache of parsed source files stored in a directory.
+
+    The expressions of a parsed file are stored in a compact form
+    using marshal, in a file named by a hash of the source contents
+    and the cache format.  Loading an unchanged file again, from any
+    path, then skips tokenizing and parsing.  Entries written by other
+    versions of the format are never found, and unreadable entries
+    are parsed and written again.  If an entry can't be written, such
+    as when the directory can't be created, the file is loaded without
+    caching it.
+
+    Public methods:
+    load() -- return the expressions in a source file
+
+    Instance variables:
+    directory -- directory holding the cache entries
+
+    """
+
+    # Changed whenever the parsing or the stored form of expressions
+    # changes
+    MAGIC = 'pysc-parse-cache-3\n'
+    SUFFIX = '.pysc'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def load(self, filename):
+        """Return list of the expressions in file."""
+
+        with open(filename, 'rb') as f:
+            source = f.read()
+        path = self._path(source)
+        exprs = self._read(path)
+        if exprs is None:
+            exprs = list(Parser.from_buffer(source).expressions())
+            try:
+                self._write(path, exprs)
+            except EnvironmentError:
+                # Only slower without the entry
+                pass
+        return exprs
+
+    def _path(self, source):
+        digest = hashlib.sha1(self.MAGIC + source).hexdigest()
+        return os.path.join(self.directory, digest + self.SUFFIX)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(self.MAGIC)) != self.MAGIC:
+                    return None
+                atoms = {}
+                return [self._decode(x, atoms) for x in marshal.load(f)]
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+
+    def _write(self, path, exprs):
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Write to a temporary file first, so that concurrent runs
+        # never see a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.MAGIC)
+                marshal.dump([self._encode(x) for x in exprs], f)
+            os.rename(tmp_path, path)
+        except:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def _encode(cls, expr):
+        """Return expr as nested lists, strings and tuples.
+
+        A combination becomes a list, a name a string and a constant
+        a tuple holding the value, or the numerator and denominator of
+        a rational, which marshal can't store.
+
+        """
+
+        if expr.type_ == Expression.COMBINATION:
+            return [cls._encode(x) for x in expr.contents]
+        elif expr.type_ == Expression.NAME:
+            return expr.contents
+        value = expr.contents
+        if value.__class__ is Fraction:
+            return (value.numerator, value.denominator)
+        return (value,)
+
+    @classmethod
+    def _decode(cls, data, atoms):
+        """Return Expression encoded by _encode().
+
+        Names and constants are shared through the dictionary atoms,
+        like the Parser does.
+
+        """
+
+        if isinstance(data, list):
+            return Expression([cls._decode(x, atoms) for x in data],
+                              Expression.COMBINATION)
+        if isinstance(data, tuple):
+            # Constants that compare equal, like 1 and 1.0, must not
+            # be shared.
+            key = (data[0].__class__, repr(data))
+        else:
+            key = data
+        try:
+            return atoms[key]
+        except KeyError:
+            if isinstance(data, tuple):
+                if len(data) == 2:
+                    value = Fraction(*data)
+                else:
+                    value = data[0]
+                expr = Expression(value, Expression.CONSTANT)
+            else:
+                expr = Expression(intern(data), Expression.NAME)
+            atoms[key] = expr
+            return expr
@@ -1,18 +1,153 @@
 import random
 import time
 import operator
+import collections
+from fractions import Fraction
+from output import OutputPort, StringPort
 
 
-class TailCall(Exception):
-    def __init__(self, expr, namespace):
-        self.expr = expr
-        self.namespace = namespace
+class TailCall(object):
+
+    """Marker returned by a call in tail position.
+
+    Instead of running the body of the called procedure, which would
+    grow the Python stack, a tail call returns this marker holding the
+    execution procedure and frame to continue with.  execute() then
+    runs it in a loop.
+
+    """
+
+    __slots__ = ('code', 'frame')
+
+    def __init__(self, code, frame):
+        self.code = code
+        self.frame = frame
 
 
 class SymbolError(Exception):
     pass
 
 
+class ArityError(Exception):
+    pass
+
+
+# Value of internally defined names before their define is run
+_UNASSIGNED = object()
+
+
+def execute(code, frame):
+    """Call execution procedure code with frame and return the result.
+
+    Tail calls returned while running it are executed in turn, so
+    that the stack does not grow for them.
+
+    """
+
+    result = code(frame)
+    while result.__class__ is TailCall:
+        result = result.code(result.frame)
+    return result
+
+
+class Frame(object):
+
+    """Local bindings made by one application of a Procedure.
+
+    Instance variables:
+    values -- list of values, parameters first and then internally
+              defined names, in the order given by the Scope of the
+              procedure body
+    parent -- Frame of the enclosing procedure, or None for
+              procedures defined at top level
+
+    """
+
+    __slots__ = ('values', 'parent')
+
+    def __init__(self, values, parent=None):
+        self.values = values
+        self.parent = parent
+
+
+class Scope(object):
+
+    """Names bound by a procedure body, used during analysis.
+
+    Public methods:
+    for_body() -- create Scope of a procedure body
+    resolve() -- return lexical address of a name
+
+    Instance variables:
+    names -- list of names, in slot order
+    parent -- Scope of the enclosing procedure body, or None
+    parameters -- number of names that are parameters, which are
+                  always assigned
+
+    """
+
+    def __init__(self, names, parent=None, parameters=0):
+        self.names = names
+        self.parent = parent
+        self.parameters = parameters
+
+    @classmethod
+    def for_body(cls, parameters, body, parent=None):
+        """Return Scope of procedure body below parent.
+
+        The names defined in the body get slots after the parameters.
+
+        """
+
+        names = list(parameters)
+        for name in cls._defined_names(body):
+            if name not in names:
+                names.append(name)
+        return cls(names, parent, len(parameters))
+
+    @classmethod
+    def _defined_names(cls, exprs):
+        """Return names defined by exprs, not counting nested bodies."""
+
+        names = []
+        for expr in exprs:
+            fields = expr.contents
+            if expr.type_ != Expression.COMBINATION or not fields:
+                continue
+            first = fields[0]
+            if first.type_ == Expression.NAME and first.contents == 'quote':
+                continue
+            if first.type_ == Expression.NAME and \
+                    first.contents == 'define' and len(fields) > 1:
+                target = fields[1]
+                if target.type_ == Expression.COMBINATION:
+                    names.append(target.contents[0].contents)
+                else:
+                    names.append(target.contents)
+                    names.extend(cls._defined_names(fields[2:]))
+            else:
+                names.extend(cls._defined_names(fields))
+        return names
+
+    def resolve(self, name):
+        """Return (depth, index, scope) of name, or None if global.
+
+        depth is the number of frames to go up from the current one,
+        index is the slot within that frame and scope is the Scope
+        binding the name.
+
+        """
+
+        depth = 0
+        scope = self
+        while scope is not None:
+            if name in scope.names:
+                return depth, scope.names.index(name), scope
+            scope = scope.parent
+            depth += 1
+        return None
+
+
 class Expression(object):
 
     """Store expressions
@@ -27,16 +162,27 @@ class Expression(object):
 
     Instance variables:
     type_ -- type of expression
+    contents -- contents of expression, whatever the type
     fields -- contents of expression if type is a combination
     scalar -- contents of expression if type is a constant or name
 
+    Expressions are never modified once created, so equal names and
+    constants can share one instance.  Code that walks expressions
+    many times can use type_ and contents directly instead of the
+    checked properties.
+
     """
 
+    __slots__ = ('type_', 'contents')
+
     CONSTANT, NAME, COMBINATION = range(3)
     def __init__(self, contents, type_=NAME):
         self.type_ = type_
         self.contents = contents
 
+    def __reduce__(self):
+        return Expression, (self.contents, self.type_)
+
     @property
     def scalar(self):
         if self.type_ != self.CONSTANT and self.type_ != self.NAME:
@@ -101,21 +247,222 @@ class Expression(object):
         return result
 
 
+class Symbol(str):
+
+    """Name used as a value, as made by quote."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return str.__str__(self)
+
+
+class EmptyList(object):
+
+    """Type of the empty list, of which NIL is the only instance."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return '()'
+
+    __str__ = __repr__
+
+    def __reduce__(self):
+        # Unpickled as the same instance
+        return 'NIL'
+
+
+NIL = EmptyList()
+
+
+class Pair(object):
+
+    """Pair of values, the building block of lists.
+
+    A list is a chain of pairs, where the car of each pair is an
+    element and the cdr is the rest of the list, ending with NIL.
+
+    Pairs only have two slots, so that long lists are small.
+
+    """
+
+    __slots__ = ('car', 'cdr')
+
+    def __init__(self, car, cdr):
+        self.car = car
+        self.cdr = cdr
+
+    def __repr__(self):
+        elements = []
+        rest = self
+        while rest.__class__ is Pair:
+            elements.append(written(rest.car))
+            rest = rest.cdr
+        if rest is not NIL:
+            elements.extend(('.', written(rest)))
+        return '(%s)' % ' '.join(elements)
+
+    def __reduce__(self):
+        # Pickled as the list of elements and the tail, since pickling
+        # each pair inside the previous one would run out of stack on
+        # long lists.
+        elements = []
+        rest = self
+        while rest.__class__ is Pair:
+            elements.append(rest.car)
+            rest = rest.cdr
+        return make_list, (elements, rest)
+
+    __str__ = __repr__
+
+
+def written(value):
+    """Return written representation of value, as read by Scheme."""
+
+    cls = value.__class__
+    if cls is str:
+        return '"%s"' % value
+    elif cls is long or cls is Fraction:
+        # Without the L suffix of long, and as 1/3 for rationals
+        return str(value)
+    return repr(value)
+
+
+def _exact(value):
+    """Return rational value as an integer if it is one."""
+
+    if value.__class__ is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+
+# The arithmetic on rationals can give whole numbers, which are made
+# integers like those of _divide().  Only the class of the result is
+# checked, so that integers and reals are not slowed down further.
+
+def _add(a, b):
+    value = a + b
+    if value.__class__ is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+
+def _subtract(a, b):
+    value = a - b
+    if value.__class__ is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+
+def _multiply(a, b):
+    value = a * b
+    if value.__class__ is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+
+def _divide(a, b):
+    """Return a divided by b, exactly if both are exact."""
+
+    if (a.__class__ is int or a.__class__ is long) and \
+            (b.__class__ is int or b.__class__ is long):
+        if a % b:
+            return Fraction(a, b)
+        return a // b
+    # True division, since / is floor division of integer vectors
+    return _exact(operator.truediv(a, b))
+
+
+def make_list(values, tail=NIL):
+    """Return list of values, ending with tail instead of NIL if
+    given."""
+
+    result = tail
+    for value in reversed(values):
+        result = Pair(value, result)
+    return result
+
+
+def _quoted(expr):
+    """Return value of Expression expr as quoted data.
+
+    Names become symbols and combinations lists, where a name '.'
+    before the last element makes it the tail of the list.
+
+    """
+
+    type_ = expr.type_
+    if type_ == Expression.CONSTANT:
+        return expr.contents
+    elif type_ == Expression.NAME:
+        return Symbol(expr.contents)
+    fields = expr.contents
+    if len(fields) > 2 and fields[-2].type_ == Expression.NAME and \
+            fields[-2].contents == '.':
+        return make_list([_quoted(x) for x in fields[:-2]],
+                         _quoted(fields[-1]))
+    return make_list([_quoted(x) for x in fields])
+
+
 class Procedure(object):
-    def __init__(self, function, parameters=None):
+
+    """Compound procedure defined in Scheme code.
+
+    Instance variables:
+    function -- list of Expression objects making up the body
+    parameters -- list of parameter names
+    env -- global Environment the procedure was defined in (default
+           None, meaning the environment it is applied in)
+    frame -- Frame the procedure was defined in, None at top level
+    scope -- Scope of frame, used to analyze the body, None at top
+             level
+    name -- name the procedure was defined with, or None
+    code -- execution procedure of the body, analyzed on first use
+            if not set
+    defines -- number of names defined internally in the body
+    machine_code -- compiled body used by machine.Machine, or None
+
+    """
+
+    def __init__(self, function, parameters=None, env=None, frame=None,
+                 name=None, scope=None):
         self.function = function
         self.parameters = parameters
+        self.env = env
+        self.frame = frame
+        self.scope = scope
+        self.name = name
+        self.code = None
+        self.defines = 0
+        self.machine_code = None
 
     def apply(self, env, args, eliminate_tail_call=False):
-        proc_env = Environment(namespace=dict(env.namespace), creator=self)
-        proc_env.namespace.update(zip(self.parameters, args))
-        for f in self.function[:-1]:
-            proc_env.eval(f)
+        if self.code is None:
+            if self.env is None:
+                self.env = env
+            self.code, self.defines = self.env._analyze_body(
+                self.parameters, self.function, self.scope, self.name)
+        if len(args) != len(self.parameters):
+            raise ArityError('expected %d arguments, got %d' %
+                             (len(self.parameters), len(args)))
+        # The new frame only holds the parameters and internal
+        # defines.  Every other name is found by following the parent
+        # chain, starting with the frame the procedure was defined in.
+        if self.defines:
+            args = args + [_UNASSIGNED] * self.defines
+        frame = Frame(args, self.frame)
         if eliminate_tail_call:
-            raise TailCall(self.function[-1], proc_env.namespace)
-        else:
-            result = proc_env.eval(self.function[-1])
-        return result
+            return TailCall(self.code, frame)
+        return execute(self.code, frame)
+
+    def __getstate__(self):
+        # The analyzed and compiled bodies only exist in this process,
+        # and are made again when needed.
+        state = self.__dict__.copy()
+        state['code'] = state['machine_code'] = None
+        state['defines'] = 0
+        return state
 
     def __eq__(self, other):
         return self.function == other.function and \
@@ -134,9 +481,32 @@ class DummyStream:
 
 
 class BuiltinProcedure(object):
-    def __init__(self, function, needs_stream=False, stream=None):
+
+    """Procedure implemented in Python.
+
+    Instance variables:
+    function -- Python function called with the list of arguments,
+                and the stream as well if needs_stream is true
+    needs_stream -- True if function writes to stream
+    stream -- output stream, or None
+    binary -- Python function computing the same value as function
+              when called with two arguments as separate parameters,
+              or None.  Calls with two operands are dispatched to it
+              directly while the name is bound to this procedure.
+    pure -- True if function has no side effects and its value
+            depends only on the arguments, so that applications to
+            constants may be computed in advance
+    name -- name the procedure is bound to, or None
+
+    """
+
+    def __init__(self, function, needs_stream=False, stream=None,
+                 binary=None, pure=False, name=None):
         self.function = function
         self.needs_stream = needs_stream
+        self.binary = binary
+        self.pure = pure
+        self.name = name
         if needs_stream:
             if stream is None:
                 stream = DummyStream()
@@ -168,8 +538,174 @@ class BuiltinProcedure(object):
         return not self.__eq__(other)
 
 
+class MemoizedProcedure(object):
+
+    """Procedure caching the results of another procedure.
+
+    The results are cached by the tuple of the arguments and their
+    types, since 1, 1.0 and true are equal but give different results
+    to many procedures.  Only the size
+    most recently used results are kept, and the least recently used
+    one is dropped when adding another.  Applications to arguments
+    which can't be used as dictionary keys are not cached.
+
+    Since a cached result is returned without applying the procedure
+    again, it should be pure, without side effects and with a value
+    depending only on the arguments.
+
+    machine.Machine looks results up and stores them itself, so that
+    the applications of a compound procedure stay on its own stack.
+
+    Public methods:
+    key() -- return the cache key of a list of arguments
+    cached() -- return the cached result for a key
+    store() -- cache the result for a key
+
+    Instance variables:
+    procedure -- procedure whose results are cached
+    size -- maximum number of cached results
+    cache -- OrderedDict of results by arguments, least recently used
+             first
+    hits -- number of applications answered from the cache
+    misses -- number of applications of procedure
+
+    """
+
+    default_size = 1000
+
+    def __init__(self, procedure, size=None):
+        if size is None:
+            size = self.default_size
+        self.procedure = procedure
+        self.size = size
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def apply(self, env, args, eliminate_tail_call=False):
+        # The result is needed to cache it, so tail calls can't be
+        # eliminated.
+        key = self.key(args)
+        try:
+            return self.cached(key)
+        except KeyError:
+            result = self.procedure.apply(env, args)
+            self.store(key, result)
+            return result
+        except TypeError:
+            return self.procedure.apply(env, args)
+
+    def key(self, args):
+        return tuple([(arg.__class__, arg) for arg in args])
+
+    def cached(self, key):
+        """Return the result cached for key, counting a hit.
+
+        Raise KeyError if there is none, or TypeError if key can't be
+        cached, counting a miss.
+
+        """
+
+        cache = self.cache
+        try:
+            result = cache.pop(key)
+        except (KeyError, TypeError):
+            self.misses += 1
+            raise
+        self.hits += 1
+        cache[key] = result
+        return result
+
+    def store(self, key, result):
+        """Cache result for key, dropping the least recently used
+        result if the cache is full."""
+
+        cache = self.cache
+        cache[key] = result
+        if len(cache) > self.size:
+            cache.popitem(last=False)
+
+
+def _discard_code(values):
+    """Drop the analyzed and compiled bodies of the procedures in
+    values, and of those reachable from them through lists, closures
+    and memoized procedures, so that they are made again when next
+    applied."""
+
+    pending = list(values)
+    seen = set()
+    while pending:
+        value = pending.pop()
+        cls = value.__class__
+        if cls is not Pair and cls is not Procedure and \
+                cls is not Frame and cls is not MemoizedProcedure:
+            continue
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        if cls is Pair:
+            pending.append(value.car)
+            pending.append(value.cdr)
+        elif cls is Procedure:
+            value.code = value.machine_code = None
+            value.defines = 0
+            if value.frame is not None:
+                pending.append(value.frame)
+        elif cls is Frame:
+            pending.extend(value.values)
+            if value.parent is not None:
+                pending.append(value.parent)
+        else:
+            pending.append(value.procedure)
+            pending.extend(value.cache.itervalues())
+
+
 class Environment(object):
-    def __init__(self, namespace=None, special_forms=None, creator=None):
+
+    """Global environment in which expressions are evaluated.
+
+    Expressions are not interpreted directly.  They are first analyzed
+    into execution procedures, Python closures that take the Frame of
+    local bindings to run in as their only argument (None at top
+    level), which are then called to get the value.  The body of a
+    procedure is analyzed only once, when its define is analyzed.
+
+    During analysis, every name bound by an enclosing procedure is
+    resolved to its lexical address, a (depth, index) pair, so that
+    it can be read directly from the right Frame.  Only names which
+    are not bound locally are looked up in the namespace dictionary.
+
+    Public methods:
+    eval() -- evaluate an Expression in this environment
+    analyze() -- return the execution procedure of an Expression
+    lookup() -- return the global value bound to a name
+
+    Instance variables:
+    namespace -- dictionary of the global bindings
+    special_forms -- dictionary of special form handlers
+    parent -- enclosing Environment, searched for names not found
+              in namespace, or None
+    profiler -- profiler.Profiler or profiler.SamplingProfiler to
+                tell about applications of the procedures analyzed
+                from now on, or None
+    limits -- limits.Limits checked by every procedure applied, or
+              None.  Setting them makes the procedures bound so far
+              analyzed again when next applied, with the checks.
+
+    """
+
+    profiler = None
+    _limits = None
+
+    # Methods analyzing the special forms, by name
+    _syntax = {'define': '_analyze_define',
+               'if': '_analyze_if',
+               'cond': '_analyze_cond',
+               'and': '_analyze_and',
+               'or': '_analyze_or',
+               'quote': '_analyze_quote'}
+
+    def __init__(self, namespace=None, special_forms=None, parent=None):
         if namespace is None:
             namespace = {}
         if special_forms is None:
@@ -177,12 +713,24 @@ class Environment(object):
                              'if': self._if,
                              'cond': self._cond,
                              'and': self._and,
-                             'or': self._or}
+                             'or': self._or,
+                             'quote': self._quote}
 
         self.namespace = namespace
         self.special_forms = special_forms
-        self.creator = creator
-        self._special_form_tail_call = True
+        self.parent = parent
+
+    @property
+    def limits(self):
+        return self._limits
+
+    @limits.setter
+    def limits(self, limits):
+        # The checks are made part of the bodies when analyzed or
+        # compiled, so those made before check the previous limits,
+        # if any.
+        self._limits = limits
+        _discard_code(self.namespace.itervalues())
 
     def eval(self, expr):
         """Evaluate expression.
@@ -191,55 +739,291 @@ class Environment(object):
 
         """
 
-        saved_namespace = self.namespace
-        while True:
-            try:
-                result = self._evaluate(expr)
-            except TailCall as tc:
-                expr = tc.expr
-                self.namespace = tc.namespace
-            else:
-                break
+        return execute(self.analyze(expr), None)
 
-        self.namespace = saved_namespace
-        return result
+    def lookup(self, name):
+        """Return value bound to name.
 
-    def _evaluate(self, expr):
-        if expr.is_name():
-            try:
-                result = self.namespace[expr.scalar]
-            except KeyError:
-                raise SymbolError('%s undefined' % expr.scalar)
-            return result
-        elif expr.is_constant():
-            return expr.scalar
-        elif expr.fields[0].scalar in self.special_forms:
-            f = self.special_forms[expr.fields[0].scalar]
-            return f(expr.fields[1:])
+        The environments are searched from this one and outwards.
+        Raise SymbolError if no environment binds the name.
+
+        """
+
+        env = self
+        while env is not None:
+            namespace = env.namespace
+            if name in namespace:
+                return namespace[name]
+            env = env.parent
+        raise SymbolError('%s undefined' % name)
+
+    def analyze(self, expr, tail=True):
+        """Return execution procedure of top level expression.
+
+        The execution procedure is called with None as the frame.  If
+        tail is true the expression is in tail position, and calls
+        made by it return TailCall markers instead of growing the
+        stack, so the result must be passed through execute().
+
+        """
+
+        return self._analyze(expr, None, tail)
+
+    def _analyze(self, expr, scope, tail):
+        type_ = expr.type_
+        if type_ == Expression.NAME:
+            return self._analyze_variable(expr.contents, scope)
+        elif type_ == Expression.CONSTANT:
+            value = expr.contents
+            return lambda frame: value
+
+        fields = expr.contents
+        first = fields[0]
+        if first.type_ == Expression.NAME and \
+                first.contents in self.special_forms:
+            name = first.contents
+            operands = fields[1:]
+            if name in self._syntax:
+                return getattr(self, self._syntax[name])(operands, scope, tail)
+            handler = self.special_forms[name]
+            return lambda frame: handler(operands)
+        return self._analyze_application(fields, scope, tail)
+
+    def _analyze_variable(self, name, scope):
+        address = scope.resolve(name) if scope is not None else None
+        if address is None:
+            env = self
+
+            def global_variable(frame):
+                try:
+                    return env.namespace[name]
+                except KeyError:
+                    return env.lookup(name)
+            return global_variable
+
+        depth, index, binding_scope = address
+        if depth == 0 and index < binding_scope.parameters:
+            return lambda frame: frame.values[index]
+        elif depth == 1 and index < binding_scope.parameters:
+            return lambda frame: frame.parent.values[index]
         else:
-            # 1. Evaluate the subexpressions of the combination
-            l = [self.eval(subexpr) for subexpr in expr.fields]
-            # 2. Apply the operator to the operands
-            f = l[0]
-            return f.apply(self, l[1:], eliminate_tail_call=True)
+            def local_variable(frame):
+                for _ in xrange(depth):
+                    frame = frame.parent
+                value = frame.values[index]
+                if value is _UNASSIGNED:
+                    raise SymbolError('%s unassigned' % name)
+                return value
+        return local_variable
 
-    def _define(self, operands):
-        """Apply special form 'define' to operands.
+    def _analyze_sequence(self, exprs, scope, tail=True):
+        """Return execution procedure for a list of expressions.
 
-        Operands are represented as a list of Expression objects.
+        The value of the last expression is the value of the
+        sequence.
+
+        """
+
+        codes = [self._analyze(expr, scope, False) for expr in exprs[:-1]]
+        last = self._analyze(exprs[-1], scope, tail)
+        if not codes:
+            return last
+
+        def sequence(frame):
+            for code in codes:
+                code(frame)
+            return last(frame)
+        return sequence
+
+    def _analyze_body(self, parameters, body, scope, name=None):
+        """Analyze procedure body in a new scope below scope.
+
+        Return the execution procedure together with the number of
+        slots needed for internal defines, which follow the
+        parameters in the frame.  When profiling, the bodies of named
+        procedures are timed by the profiler, and with limits every
+        body checks them.
+
+        """
+
+        body_scope = Scope.for_body(parameters, body, scope)
+        code = self._analyze_sequence(body, body_scope)
+        if self.profiler is not None and name is not None:
+            code = self.profiler.wrap(name, code)
+        if self.limits is not None:
+            code = self.limits.wrap(code)
+        return code, len(body_scope.names) - body_scope.parameters
+
+    def _binary_builtin(self, fields, scope):
+        """Return builtin with a binary fast path applied by fields.
+
+        Return None unless fields is an application of a global name,
+        currently bound to a BuiltinProcedure with a binary function,
+        to exactly two operands.  The caller must still check that the
+        name is bound to the same procedure when the application is
+        run, since it may be redefined.
 
         """
 
+        first = fields[0]
+        if len(fields) != 3 or first.type_ != Expression.NAME:
+            return None
+        name = first.contents
+        if scope is not None and scope.resolve(name) is not None:
+            return None
+        try:
+            value = self.lookup(name)
+        except SymbolError:
+            return None
+        if getattr(value, 'binary', None) is None:
+            return None
+        return value
+
+    def _analyze_application(self, fields, scope, tail):
+        operand_codes = [self._analyze(field, scope, False)
+                         for field in fields[1:]]
+        env = self
+        builtin = self._binary_builtin(fields, scope)
+        if builtin is not None:
+            name = fields[0].contents
+            binary = builtin.binary
+            left_code, right_code = operand_codes
+
+            def binary_application(frame):
+                try:
+                    f = env.namespace[name]
+                except KeyError:
+                    f = env.lookup(name)
+                if f is builtin:
+                    return binary(left_code(frame), right_code(frame))
+                return f.apply(env, [left_code(frame), right_code(frame)],
+                               tail)
+            return binary_application
+
+        operator_code = self._analyze(fields[0], scope, False)
+
+        def application(frame):
+            f = operator_code(frame)
+            return f.apply(env, [code(frame) for code in operand_codes], tail)
+        return application
+
+    def _analyze_define(self, operands, scope, tail):
         if operands[0].is_combination():
             name = operands[0].fields[0].scalar
-            value = Procedure(operands[1:],
-                              parameters=[x.scalar for x in
-                                          operands[0].fields[1:]])
+            parameters = [x.scalar for x in operands[0].fields[1:]]
+            body = operands[1:]
+            body_code, defines = self._analyze_body(parameters, body, scope,
+                                                    name)
+            env = self
+
+            def value_code(frame):
+                value = Procedure(body, parameters=parameters, env=env,
+                                  frame=frame, name=name, scope=scope)
+                value.code = body_code
+                value.defines = defines
+                return value
         else:
             name = operands[0].scalar
-            value =  self.eval(operands[1])
-        self.namespace[name] = value
-        return name
+            value_code = self._analyze(operands[1], scope, False)
+
+        if scope is None:
+            env = self
+
+            def define(frame):
+                env.namespace[name] = value_code(frame)
+                return name
+        else:
+            # Internal defines always end up in the innermost frame
+            index = scope.names.index(name)
+
+            def define(frame):
+                frame.values[index] = value_code(frame)
+                return name
+        return define
+
+    def _analyze_cond(self, operands, scope, tail):
+        # The clauses are turned into a chain of conditionals, built
+        # from the last clause and backwards.
+        code = None
+        for case in reversed(operands):
+            predicate = case.fields[0]
+            consequent_code = self._analyze_sequence(case.fields[1:], scope,
+                                                     tail)
+            if not predicate.is_combination() and predicate.scalar == 'else':
+                code = consequent_code
+            else:
+                code = self._conditional(
+                    self._analyze(predicate, scope, False),
+                    consequent_code, code)
+        if code is None:
+            return lambda frame: None
+        return code
+
+    def _analyze_if(self, operands, scope, tail):
+        predicate_code = self._analyze(operands[0], scope, False)
+        consequent_code = self._analyze(operands[1], scope, tail)
+        if len(operands) > 2:
+            alternative_code = self._analyze(operands[2], scope, tail)
+        else:
+            alternative_code = None
+        return self._conditional(predicate_code, consequent_code,
+                                 alternative_code)
+
+    def _conditional(self, predicate_code, consequent_code, alternative_code):
+        """Return execution procedure of a conditional.
+
+        The value is that of consequent_code if predicate_code returns
+        a true value, otherwise that of alternative_code, or None if
+        there is no alternative.
+
+        """
+
+        if alternative_code is None:
+            def conditional(frame):
+                if predicate_code(frame):
+                    return consequent_code(frame)
+                return None
+        else:
+            def conditional(frame):
+                if predicate_code(frame):
+                    return consequent_code(frame)
+                return alternative_code(frame)
+        return conditional
+
+    def _analyze_and(self, operands, scope, tail):
+        codes = [self._analyze(operand, scope, False) for operand in operands]
+
+        def and_(frame):
+            for code in codes:
+                last_val = code(frame)
+                if not last_val:
+                    return False
+            return last_val
+        return and_
+
+    def _analyze_or(self, operands, scope, tail):
+        codes = [self._analyze(operand, scope, False) for operand in operands]
+
+        def or_(frame):
+            for code in codes:
+                last_val = code(frame)
+                if last_val:
+                    return last_val
+            return False
+        return or_
+
+    def _analyze_quote(self, operands, scope, tail):
+        value = _quoted(operands[0])
+        return lambda frame: value
+
+    def _define(self, operands):
+        """Apply special form 'define' to operands.
+
+        Operands are represented as a list of Expression objects.
+
+        """
+
+        return self._analyze_define(operands, None, False)(None)
 
     def _cond(self, operands):
         """Apply special form 'cond' to operands.
@@ -248,17 +1032,7 @@ class Environment(object):
 
         """
 
-        for case in operands:
-            if not case.fields[0].is_combination() and \
-                    case.fields[0].scalar == 'else' or \
-                    self.eval(case.fields[0]):
-                for expr in case.fields[1:-1]:
-                    self.eval(expr)
-                if self._special_form_tail_call:
-                    raise TailCall(case.fields[-1], self.namespace)
-                else:
-                    return self.eval(case.fields[-1])
-        return None
+        return execute(self._analyze_cond(operands, None, True), None)
 
     def _if(self, operands):
         """Apply special form 'if' to operands.
@@ -267,12 +1041,7 @@ class Environment(object):
 
         """
 
-        expr = [Expression([operands[0], operands[1]],
-                           Expression.COMBINATION)]
-        if len(operands) > 2:
-            expr.append(Expression([Expression('else'), operands[2]],
-                                   Expression.COMBINATION))
-        return self._cond(expr)
+        return execute(self._analyze_if(operands, None, True), None)
 
     def _and(self, operands):
         """Apply special form 'and' to operands.
@@ -281,11 +1050,7 @@ class Environment(object):
 
         """
 
-        for operand in operands:
-            last_val = self.eval(operand)
-            if not last_val:
-                return False
-        return last_val
+        return self._analyze_and(operands, None, False)(None)
 
     def _or(self, operands):
         """Apply special form 'or' to operands.
@@ -294,31 +1059,41 @@ class Environment(object):
 
         """
 
-        for operand in operands:
-            last_val = self.eval(operand)
-            if last_val:
-                return last_val
-        return False
+        return self._analyze_or(operands, None, False)(None)
+
+    def _quote(self, operands):
+        """Apply special form 'quote' to operands.
+
+        Operands are represented as a list of Expression objects.
+
+        """
+
+        return _quoted(operands[0])
 
 
 class Builtins(object):
     @classmethod
     def add(cls, operands):
-        return sum(operands)
+        return _exact(sum(operands))
 
     @classmethod
     def subtract(cls, operands):
         if len(operands) == 1:
             return -operands[0]
-        return operands[0] - sum(operands[1:])
+        return _exact(operands[0] - sum(operands[1:]))
 
     @classmethod
     def multiply(cls, operands):
-        return reduce(operator.mul, operands)
+        return _exact(reduce(operator.mul, operands))
 
     @classmethod
     def divide(cls, operands):
-        return operands[0] / sum(operands[1:])
+        if len(operands) == 1:
+            return _divide(1, operands[0])
+        result = operands[0]
+        for operand in operands[1:]:
+            result = _divide(result, operand)
+        return result
 
     @classmethod
     def not_(self, operands):
@@ -342,16 +1117,71 @@ class Builtins(object):
 
     @classmethod
     def remainder(cls, operands):
-        return operands[0] % operands[1]
+        return _exact(operands[0] % operands[1])
+
+    @classmethod
+    def exact_to_inexact(cls, operands):
+        return float(operands[0])
+
+    @classmethod
+    def inexact_to_exact(cls, operands):
+        value = operands[0]
+        if value.__class__ is float:
+            return _exact(Fraction(value))
+        return value
+
+    @classmethod
+    def exact(cls, operands):
+        type_ = operands[0].__class__
+        return type_ is int or type_ is long or type_ is Fraction
+
+    @classmethod
+    def inexact(cls, operands):
+        return operands[0].__class__ is float
+
+    @classmethod
+    def numerator(cls, operands):
+        value = operands[0]
+        if value.__class__ is float:
+            return float(Fraction(value).numerator)
+        return value.numerator
+
+    @classmethod
+    def denominator(cls, operands):
+        value = operands[0]
+        if value.__class__ is float:
+            return float(Fraction(value).denominator)
+        return value.denominator
 
     @classmethod
     def newline(cls, operands, stream):
+        if operands:
+            stream = operands[0]
         stream.write('\n')
 
     @classmethod
     def display(cls, operands, stream):
+        if len(operands) > 1:
+            stream = operands[1]
         stream.write(str(operands[0]))
 
+    @classmethod
+    def flush_output(cls, operands, stream):
+        if operands:
+            stream = operands[0]
+        stream.flush()
+
+    @classmethod
+    def current_output_port(cls, operands, stream):
+        return stream.current()
+
+    @classmethod
+    def with_output_to_string(cls, operands, stream):
+        thunk = operands[0]
+        port = StringPort()
+        stream.with_output_to(port, lambda: thunk.apply(None, []))
+        return port.getvalue()
+
     @classmethod
     def runtime(cls, operands):
         return int(time.time() * 1000000)
@@ -360,23 +1190,160 @@ class Builtins(object):
     def random(cls, operands):
         return random.randint(0, operands[0] - 1)
 
+    @classmethod
+    def cons(cls, operands):
+        return Pair(operands[0], operands[1])
+
+    @classmethod
+    def car(cls, operands):
+        return operands[0].car
+
+    @classmethod
+    def cdr(cls, operands):
+        return operands[0].cdr
+
+    @classmethod
+    def list_(cls, operands):
+        return make_list(operands)
+
+    @classmethod
+    def null(cls, operands):
+        return operands[0] is NIL
+
+    @classmethod
+    def pair(cls, operands):
+        return operands[0].__class__ is Pair
+
+    @classmethod
+    def length(cls, operands):
+        length = 0
+        rest = operands[0]
+        while rest.__class__ is Pair:
+            length += 1
+            rest = rest.cdr
+        if rest is not NIL:
+            raise TypeError('length of improper list')
+        return length
+
+    @classmethod
+    def append(cls, operands):
+        if not operands:
+            return NIL
+        values = []
+        for rest in operands[:-1]:
+            while rest.__class__ is Pair:
+                values.append(rest.car)
+                rest = rest.cdr
+        return make_list(values, operands[-1])
+
+    @classmethod
+    def map_(cls, operands):
+        # The procedures applied always know their environment, except
+        # for builtins which don't need one.
+        procedure = operands[0]
+        values = []
+        if len(operands) == 2:
+            rest = operands[1]
+            while rest.__class__ is Pair:
+                values.append(procedure.apply(None, [rest.car]))
+                rest = rest.cdr
+        else:
+            lists = operands[1:]
+            while all(rest.__class__ is Pair for rest in lists):
+                values.append(procedure.apply(
+                    None, [rest.car for rest in lists]))
+                lists = [rest.cdr for rest in lists]
+        return make_list(values)
+
+    @classmethod
+    def reverse(cls, operands):
+        result = NIL
+        rest = operands[0]
+        while rest.__class__ is Pair:
+            result = Pair(rest.car, result)
+            rest = rest.cdr
+        return result
+
+    @classmethod
+    def memoize(cls, operands):
+        return MemoizedProcedure(*operands)
+
+    @classmethod
+    def memoize_hits(cls, operands):
+        return operands[0].hits
+
+    @classmethod
+    def memoize_misses(cls, operands):
+        return operands[0].misses
+
     @classmethod
     def namespace(cls, outstream=None):
-        return {
+        # The builtins writing output share one port, which can send
+        # the output elsewhere for a while.  A port made here for
+        # another kind of stream passes every write straight on, as
+        # the stream may be read at any time.
+        if outstream is None:
+            outstream = DummyStream()
+        if not isinstance(outstream, OutputPort):
+            outstream = OutputPort(outstream, buffer_size=0)
+        namespace = {
             'true': True,
             'false': False,
-            '+': BuiltinProcedure(cls.add),
-            '-': BuiltinProcedure(cls.subtract),
-            '*': BuiltinProcedure(cls.multiply),
-            '/': BuiltinProcedure(cls.divide),
-            'not': BuiltinProcedure(cls.not_),
-            '>': BuiltinProcedure(cls.greater_than),
-            '<': BuiltinProcedure(cls.less_than),
-            '=': BuiltinProcedure(cls.equals),
-            'abs': BuiltinProcedure(cls.abs),
-            'remainder': BuiltinProcedure(cls.remainder),
+            '+': BuiltinProcedure(cls.add, binary=_add,
+                                  pure=True),
+            '-': BuiltinProcedure(cls.subtract, binary=_subtract,
+                                  pure=True),
+            '*': BuiltinProcedure(cls.multiply, binary=_multiply,
+                                  pure=True),
+            '/': BuiltinProcedure(cls.divide, binary=_divide, pure=True),
+            'not': BuiltinProcedure(cls.not_, pure=True),
+            '>': BuiltinProcedure(cls.greater_than, binary=operator.gt,
+                                  pure=True),
+            '<': BuiltinProcedure(cls.less_than, binary=operator.lt,
+                                  pure=True),
+            '=': BuiltinProcedure(cls.equals, binary=operator.eq,
+                                  pure=True),
+            'abs': BuiltinProcedure(cls.abs, pure=True),
+            'remainder': BuiltinProcedure(cls.remainder, pure=True),
+            'exact->inexact': BuiltinProcedure(cls.exact_to_inexact,
+                                               pure=True),
+            'inexact->exact': BuiltinProcedure(cls.inexact_to_exact,
+                                               pure=True),
+            'exact?': BuiltinProcedure(cls.exact, pure=True),
+            'inexact?': BuiltinProcedure(cls.inexact, pure=True),
+            'numerator': BuiltinProcedure(cls.numerator, pure=True),
+            'denominator': BuiltinProcedure(cls.denominator, pure=True),
             'newline': BuiltinProcedure(cls.newline, True, outstream),
             'display': BuiltinProcedure(cls.display, True, outstream),
+            'flush-output': BuiltinProcedure(cls.flush_output, True,
+                                             outstream),
+            'current-output-port': BuiltinProcedure(cls.current_output_port,
+                                                    True, outstream),
+            'with-output-to-string': BuiltinProcedure(
+                cls.with_output_to_string, True, outstream),
             'runtime': BuiltinProcedure(cls.runtime),
-            'random': BuiltinProcedure(cls.random)
+            'random': BuiltinProcedure(cls.random),
+            'nil': NIL,
+            'cons': BuiltinProcedure(cls.cons, binary=Pair),
+            'car': BuiltinProcedure(cls.car),
+            'cdr': BuiltinProcedure(cls.cdr),
+            'list': BuiltinProcedure(cls.list_),
+            'null?': BuiltinProcedure(cls.null),
+            'pair?': BuiltinProcedure(cls.pair),
+            'length': BuiltinProcedure(cls.length),
+            'append': BuiltinProcedure(cls.append),
+            'map': BuiltinProcedure(cls.map_),
+            'reverse': BuiltinProcedure(cls.reverse),
+            'memoize': BuiltinProcedure(cls.memoize),
+            'memoize-hits': BuiltinProcedure(cls.memoize_hits),
+            'memoize-misses': BuiltinProcedure(cls.memoize_misses)
         }
+        # Imported here since these modules build on this one
+        import vectors
+        import parallel
+        namespace.update(vectors.namespace())
+        namespace.update(parallel.namespace(outstream))
+        for name, value in namespace.iteritems():
+            if isinstance(value, BuiltinProcedure):
+                value.name = name
+        return namespace
@@ -0,0 +1,157 @@
+"""Images of the global bindings of an Environment.
+
+An image holds every global binding made by evaluating code, such as
+a prelude defining many procedures, so that a new interpreter can load
+it instead of evaluating that code again.  The values are stored with
+pickle, except for the builtins, which are stored by name and replaced
+by the builtins of the environment loading the image, with their own
+output stream.  Procedures are stored without their analyzed or
+compiled bodies, which are made again on the first application.
+
+Public functions:
+save() -- write the global bindings of an environment to a file
+load() -- bind the values in an image file in an environment
+dump() -- write an image to an open file
+read() -- bind the values in an image read from an open file
+dumps() -- return a value pickled the way images store it
+loads() -- return a value pickled by dumps()
+
+"""
+
+import gc
+import cPickle
+import cStringIO
+from environment import Environment, BuiltinProcedure, _UNASSIGNED
+
+
+# Changed whenever the stored form of any value changes, so that older
+# images are rejected instead of loaded wrong
+MAGIC = 'pysc-image-1\n'
+
+
+class ImageError(Exception):
+    pass
+
+
+def save(env, filename):
+    """Write the global bindings of env to file as an image.
+
+    Raise ImageError if a value can't be stored, such as a builtin
+    not bound to a name.
+
+    """
+
+    with open(filename, 'wb') as f:
+        dump(env, f)
+
+
+def dump(env, f):
+    """Write the global bindings of env as an image to open file f."""
+
+    f.write(MAGIC)
+    pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = _persistent_id(env)
+    try:
+        pickler.dump(env.namespace)
+    except (cPickle.PicklingError, TypeError) as error:
+        raise ImageError("can't save image: %s" % error)
+
+
+def dumps(value, env):
+    """Return string of value pickled with env and its builtins
+    stored by reference, as in an image."""
+
+    f = cStringIO.StringIO()
+    pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = _persistent_id(env)
+    try:
+        pickler.dump(value)
+    except (cPickle.PicklingError, TypeError) as error:
+        raise ImageError("can't store %r: %s" % (value, error))
+    return f.getvalue()
+
+
+def _persistent_id(env):
+    def persistent_id(obj):
+        if obj is env:
+            return 'environment'
+        elif obj is _UNASSIGNED:
+            return 'unassigned'
+        elif isinstance(obj, BuiltinProcedure):
+            if obj.name is None:
+                raise ImageError("can't save unnamed builtin %r" %
+                                 (obj.function,))
+            return 'builtin:' + obj.name
+        elif isinstance(obj, Environment):
+            raise ImageError("can't save another environment")
+        return None
+    return persistent_id
+
+
+def load(env, filename):
+    """Bind the values in image file in env.
+
+    The builtins stored are replaced by those bound in env under
+    their names when loading starts.  Raise ImageError if the file is
+    not an image of this version, or if it refers to a builtin env
+    doesn't have.
+
+    """
+
+    with open(filename, 'rb') as f:
+        read(env, f, filename)
+
+
+def read(env, f, filename='image'):
+    """Bind the values in the image read from open file f in env.
+
+    filename names the image in errors.
+
+    """
+
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ImageError('%s is not an image of this version' % filename)
+    env.namespace.update(_load(env, f, 'image %s' % filename))
+
+
+def loads(data, env):
+    """Return value pickled by dumps() in string data, with the
+    references to the environment and builtins replaced by env and
+    its builtins."""
+
+    return _load(env, cStringIO.StringIO(data), 'value')
+
+
+def _load(env, f, description):
+    builtins = {}
+    for value in env.namespace.itervalues():
+        if isinstance(value, BuiltinProcedure) and value.name is not None:
+            builtins[value.name] = value
+
+    def persistent_load(pid):
+        if pid == 'environment':
+            return env
+        elif pid == 'unassigned':
+            return _UNASSIGNED
+        name = pid[len('builtin:'):]
+        try:
+            return builtins[name]
+        except KeyError:
+            raise ImageError('no builtin %s to load %s with' %
+                             (name, description))
+
+    unpickler = cPickle.Unpickler(f)
+    unpickler.persistent_load = persistent_load
+    # Loading makes many objects at once, which would otherwise
+    # start the cycle collector over and over.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return unpickler.load()
+    except (cPickle.UnpicklingError, EOFError, ValueError,
+            AttributeError, ImportError) as error:
+        # Unknown classes are left by older versions as well
+        raise ImageError("can't load %s: %s" % (description, error))
+    finally:
+        if gc_enabled:
+            gc.enable()
@@ -0,0 +1,166 @@
+import time
+
+
+class LimitExceeded(Exception):
+    pass
+
+
+class StepLimitExceeded(LimitExceeded):
+    pass
+
+
+class TimeLimitExceeded(LimitExceeded):
+    pass
+
+
+class DepthLimitExceeded(LimitExceeded):
+    pass
+
+
+class Limits(object):
+
+    """Resource limits for evaluating untrusted code.
+
+    Setting an Environment's limits attribute makes every procedure
+    check the limits when applied, as the bodies are analyzed or
+    compiled again with the checks, so there is no cost when there
+    are no limits.  Every application is
+    a step, including tail calls, which is what any loop in Scheme
+    needs to run.
+
+    To keep the cost per step low, steps are counted down to the next
+    point where something must be checked, and the clock is only read
+    every check_interval steps.  The deadline may therefore be passed
+    by as long as that many steps take.
+
+    Public methods:
+    reset() -- start counting steps and time from now
+    step() -- count a step
+    wrap() -- return execution procedure counting a step first
+    remaining() -- return limits of what is left for work done elsewhere
+    add_steps() -- count steps taken elsewhere
+
+    Instance variables:
+    max_steps -- maximum number of steps, or None
+    timeout -- maximum number of seconds, or None
+    max_depth -- maximum number of nested applications, or None
+    check_interval -- number of steps between reading the clock
+    steps -- number of steps taken since reset
+    depth -- number of applications currently running
+    deadline -- time when the timeout expires, or None
+
+    """
+
+    def __init__(self, max_steps=None, timeout=None, max_depth=None,
+                 check_interval=1000):
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.check_interval = check_interval
+        self.depth = 0
+        self.reset()
+
+    @property
+    def steps(self):
+        return self._counted + self._block - self._countdown
+
+    def reset(self):
+        """Start counting steps and time from now."""
+
+        if self.timeout is not None:
+            self.deadline = time.time() + self.timeout
+        else:
+            self.deadline = None
+        # Steps up to the start of the current block of steps, the
+        # size of the block, and the steps left in it until the next
+        # check.
+        self._counted = 0
+        self._start_block()
+
+    def _check(self):
+        """Raise error if a limit is exceeded, otherwise start the next
+        block of steps."""
+
+        self._counted += self._block
+        self._block = self._countdown = 0
+        if self.max_steps is not None and self._counted > self.max_steps:
+            raise StepLimitExceeded('step limit %d exceeded' %
+                                    self.max_steps)
+        if self.deadline is not None and time.time() > self.deadline:
+            raise TimeLimitExceeded('time limit of %g seconds exceeded' %
+                                    self.timeout)
+        self._start_block()
+
+    def _start_block(self):
+        block = self.check_interval
+        if self.max_steps is not None:
+            # The step exceeding the limit must be checked
+            block = min(block, self.max_steps - self._counted + 1)
+        self._block = self._countdown = block
+
+    def step(self):
+        """Count a step, raising error if a limit is exceeded."""
+
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._check()
+
+    def remaining(self):
+        """Return Limits of the steps, time and depth left, for work
+        done elsewhere, such as in another process, on behalf of the
+        current evaluation.
+
+        The steps taken there should be counted here with add_steps().
+
+        """
+
+        max_steps = self.max_steps
+        if max_steps is not None:
+            max_steps -= self.steps
+        max_depth = self.max_depth
+        if max_depth is not None:
+            max_depth -= self.depth
+        limits = Limits(max_steps, self.timeout, max_depth,
+                        self.check_interval)
+        limits.deadline = self.deadline
+        return limits
+
+    def add_steps(self, steps):
+        """Count steps taken elsewhere, raising error if a limit is
+        exceeded."""
+
+        self._counted += self._block - self._countdown + steps
+        self._block = self._countdown = 0
+        self._check()
+
+    def wrap(self, code):
+        """Return execution procedure running code after a step.
+
+        The nesting depth of the applications is checked as well if
+        limited.
+
+        """
+
+        limits = self
+        max_depth = self.max_depth
+        if max_depth is None:
+            def limited(frame):
+                limits._countdown -= 1
+                if limits._countdown <= 0:
+                    limits._check()
+                return code(frame)
+            return limited
+
+        def limited(frame):
+            limits._countdown -= 1
+            if limits._countdown <= 0:
+                limits._check()
+            if limits.depth >= max_depth:
+                raise DepthLimitExceeded('depth limit %d exceeded' %
+                                         max_depth)
+            limits.depth += 1
+            try:
+                return code(frame)
+            finally:
+                limits.depth -= 1
+        return limited
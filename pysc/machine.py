@@ -0,0 +1,550 @@
+from environment import Expression, Procedure, MemoizedProcedure, Frame, \
+    Scope, SymbolError, ArityError, _UNASSIGNED, _quoted
+from limits import DepthLimitExceeded
+
+
+class RecursionDepthError(DepthLimitExceeded):
+    pass
+
+
+# Instruction opcodes.  Every instruction is an opcode followed by one
+# argument, which is unused by some of them.
+OPNAMES = ('CONST', 'LOAD_LOCAL', 'LOAD_DEREF', 'LOAD_GLOBAL', 'DEFINE_LOCAL',
+           'DEFINE_GLOBAL', 'MAKE_PROCEDURE', 'SPECIAL_FORM', 'POP', 'JUMP',
+           'JUMP_IF_FALSE', 'JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP',
+           'FALSE_IF_NOT', 'CALL', 'TAIL_CALL', 'BINARY_CALL', 'RETURN',
+           'PROFILE_ENTER', 'PROFILE_TAIL_CALL', 'PROFILE_RETURN',
+           'CHECK_LIMITS')
+(CONST, LOAD_LOCAL, LOAD_DEREF, LOAD_GLOBAL, DEFINE_LOCAL, DEFINE_GLOBAL,
+ MAKE_PROCEDURE, SPECIAL_FORM, POP, JUMP, JUMP_IF_FALSE,
+ JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, FALSE_IF_NOT, CALL, TAIL_CALL,
+ BINARY_CALL, RETURN, PROFILE_ENTER, PROFILE_TAIL_CALL, PROFILE_RETURN,
+ CHECK_LIMITS) = range(len(OPNAMES))
+
+# Opcodes whose argument is an index into the constants
+_CONSTANT_ARGS = (CONST, LOAD_DEREF, LOAD_GLOBAL, DEFINE_GLOBAL,
+                  MAKE_PROCEDURE, SPECIAL_FORM, BINARY_CALL, PROFILE_ENTER,
+                  CHECK_LIMITS)
+
+# Replacements of opcodes ending an application in profiled code
+_PROFILED = {TAIL_CALL: PROFILE_TAIL_CALL, RETURN: PROFILE_RETURN}
+
+
+class Code(object):
+
+    """Compiled form of a top level expression or procedure body.
+
+    The instructions are built up in a list while compiling, and
+    frozen into a tuple of small integers by finish().
+
+    Instance variables:
+    instructions -- flat tuple of opcodes, each followed by its
+                    argument
+    constants -- list of values referred to by the instructions
+    name -- name of the procedure, or None
+    parameters -- list of parameter names
+    defines -- number of names defined internally in the body
+
+    """
+
+    __slots__ = ('instructions', 'constants', 'name', 'parameters',
+                 'defines')
+
+    def __init__(self, name=None, parameters=(), defines=0):
+        self.instructions = []
+        self.constants = []
+        self.name = name
+        self.parameters = parameters
+        self.defines = defines
+
+    def emit(self, opcode, arg=0):
+        """Append instruction and return its position."""
+
+        self.instructions.extend((opcode, arg))
+        return len(self.instructions) - 2
+
+    def patch(self, position, arg):
+        """Set argument of instruction at position."""
+
+        self.instructions[position + 1] = arg
+
+    def here(self):
+        """Return position of the next instruction."""
+
+        return len(self.instructions)
+
+    def constant(self, value):
+        """Add value to the constants and return its index."""
+
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def finish(self):
+        """Store the instructions compactly once compiled.
+
+        A tuple is used rather than an array.array, since reading an
+        array item creates a new integer object, which made running
+        the code noticeably slower.
+
+        """
+
+        self.instructions = tuple(self.instructions)
+
+
+def disassemble(code):
+    """Return human readable listing of Code as a string.
+
+    The code of procedures created by the listed code follows it.
+
+    """
+
+    if code.name is None:
+        lines = ['code at top level']
+    else:
+        lines = ['code of %s (%s)' % (code.name, ' '.join(code.parameters))]
+    nested = []
+    instructions = code.instructions
+    for pc in xrange(0, len(instructions), 2):
+        op, arg = instructions[pc], instructions[pc + 1]
+        line = '%6d %-20s %d' % (pc, OPNAMES[op], arg)
+        if op in _CONSTANT_ARGS:
+            constant = code.constants[arg]
+            if op == MAKE_PROCEDURE:
+                nested.append(constant[1])
+                constant = constant[1].name
+            elif op == SPECIAL_FORM:
+                constant = constant[1]
+            elif op == BINARY_CALL:
+                constant = constant[0]
+            line += ' (%r)' % (constant,)
+        elif op == LOAD_LOCAL:
+            line += ' (%s)' % code.parameters[arg]
+        lines.append(line)
+    for nested_code in nested:
+        lines.append('')
+        lines.append(disassemble(nested_code))
+    return '\n'.join(lines)
+
+
+class Machine(object):
+
+    """Evaluate expressions with an explicit stack.
+
+    Expressions are compiled into Code objects, which are run by a
+    loop keeping the values and the pending procedure applications in
+    Python lists instead of on the Python stack.  The depth of
+    non-tail recursion is therefore only limited by memory, or by
+    max_depth if given, in which case RecursionDepthError is raised
+    when a procedure application would nest deeper than that.
+
+    The bindings are those of an Environment, and the procedures
+    created are ordinary Procedure objects which can also be applied
+    outside of the machine.  If the Environment has a profiler, the
+    named procedures compiled are timed by it, and if it has limits,
+    every procedure compiled checks them.  The depth limit is then
+    the smaller of max_depth and that of the limits.
+
+    Public methods:
+    eval() -- evaluate an Expression
+    compile() -- return Code of a top level Expression
+
+    Instance variables:
+    env -- Environment holding the global bindings
+    max_depth -- maximum number of nested applications, or None
+
+    """
+
+    def __init__(self, env, max_depth=None):
+        self.env = env
+        self.max_depth = max_depth
+        self._syntax = {'define': self._compile_define,
+                        'if': self._compile_if,
+                        'cond': self._compile_cond,
+                        'and': self._compile_and,
+                        'or': self._compile_or,
+                        'quote': self._compile_quote}
+
+    def eval(self, expr):
+        """Evaluate expression.
+
+        Expression is represented by an Expression object.
+
+        """
+
+        return self.run(self.compile(expr), None)
+
+    def compile(self, expr):
+        """Return Code of top level expression."""
+
+        code = Code()
+        self._compile(expr, None, True, code)
+        code.emit(RETURN)
+        code.finish()
+        return code
+
+    def _compile_body(self, name, parameters, body, scope):
+        body_scope = Scope.for_body(parameters, body, scope)
+        code = Code(name, parameters,
+                    len(body_scope.names) - body_scope.parameters)
+        profiled = self.env.profiler is not None and name is not None
+        if profiled:
+            code.emit(PROFILE_ENTER, code.constant(name))
+        if self.env.limits is not None:
+            code.emit(CHECK_LIMITS, code.constant(self.env.limits))
+        self._compile_sequence(body, body_scope, True, code)
+        code.emit(RETURN)
+        if profiled:
+            self._profile_exits(code)
+        code.finish()
+        return code
+
+    def _profile_exits(self, code):
+        """Make the instructions ending an application of code tell
+        the profiler."""
+
+        instructions = code.instructions
+        for pc in xrange(0, len(instructions), 2):
+            op = instructions[pc]
+            if op in _PROFILED:
+                instructions[pc] = _PROFILED[op]
+            elif op == BINARY_CALL:
+                constants = code.constants
+                name, builtin, binary, call = constants[instructions[pc + 1]]
+                constants[instructions[pc + 1]] = (
+                    name, builtin, binary, _PROFILED.get(call, call))
+
+    def _procedure_code(self, proc):
+        """Return Code of procedure, compiling it if needed.
+
+        Return None if the procedure was created inside another
+        procedure whose scope is not known.
+
+        """
+
+        if proc.machine_code is None and \
+                (proc.frame is None or proc.scope is not None):
+            proc.machine_code = self._compile_body(
+                proc.name, proc.parameters, proc.function, proc.scope)
+        return proc.machine_code
+
+    def _compile(self, expr, scope, tail, code):
+        type_ = expr.type_
+        if type_ == Expression.NAME:
+            self._compile_variable(expr.contents, scope, code)
+            return
+        elif type_ == Expression.CONSTANT:
+            code.emit(CONST, code.constant(expr.contents))
+            return
+
+        fields = expr.contents
+        first = fields[0]
+        special_forms = self.env.special_forms
+        if first.type_ == Expression.NAME and \
+                first.contents in special_forms:
+            name = first.contents
+            operands = fields[1:]
+            if name in self._syntax:
+                self._syntax[name](operands, scope, tail, code)
+            else:
+                code.emit(SPECIAL_FORM, code.constant(
+                    (special_forms[name], operands)))
+            return
+
+        call = TAIL_CALL if tail else CALL
+        builtin = self.env._binary_builtin(fields, scope)
+        if builtin is not None:
+            # The operator is not pushed, BINARY_CALL reads it itself
+            for field in fields[1:]:
+                self._compile(field, scope, False, code)
+            code.emit(BINARY_CALL, code.constant(
+                (first.contents, builtin, builtin.binary, call)))
+            return
+
+        for field in fields:
+            self._compile(field, scope, False, code)
+        code.emit(call, len(fields) - 1)
+
+    def _compile_variable(self, name, scope, code):
+        address = scope.resolve(name) if scope is not None else None
+        if address is None:
+            code.emit(LOAD_GLOBAL, code.constant(name))
+            return
+        depth, index, binding_scope = address
+        if depth == 0 and index < binding_scope.parameters:
+            code.emit(LOAD_LOCAL, index)
+        else:
+            code.emit(LOAD_DEREF, code.constant((depth, index, name)))
+
+    def _compile_sequence(self, exprs, scope, tail, code):
+        for expr in exprs[:-1]:
+            self._compile(expr, scope, False, code)
+            code.emit(POP)
+        self._compile(exprs[-1], scope, tail, code)
+
+    def _compile_define(self, operands, scope, tail, code):
+        if operands[0].is_combination():
+            name = operands[0].fields[0].scalar
+            parameters = [x.scalar for x in operands[0].fields[1:]]
+            body = operands[1:]
+            body_code = self._compile_body(name, parameters, body, scope)
+            code.emit(MAKE_PROCEDURE,
+                      code.constant((body, body_code, scope)))
+        else:
+            name = operands[0].scalar
+            self._compile(operands[1], scope, False, code)
+
+        if scope is None:
+            code.emit(DEFINE_GLOBAL, code.constant(name))
+        else:
+            code.emit(DEFINE_LOCAL, scope.names.index(name))
+            code.emit(CONST, code.constant(name))
+
+    def _compile_cond(self, operands, scope, tail, code):
+        end_jumps = []
+        for case in operands:
+            predicate = case.fields[0]
+            if not predicate.is_combination() and predicate.scalar == 'else':
+                self._compile_sequence(case.fields[1:], scope, tail, code)
+                break
+            self._compile(predicate, scope, False, code)
+            next_jump = code.emit(JUMP_IF_FALSE)
+            self._compile_sequence(case.fields[1:], scope, tail, code)
+            if tail:
+                code.emit(RETURN)
+            else:
+                end_jumps.append(code.emit(JUMP))
+            code.patch(next_jump, code.here())
+        else:
+            code.emit(CONST, code.constant(None))
+        for position in end_jumps:
+            code.patch(position, code.here())
+
+    def _compile_if(self, operands, scope, tail, code):
+        self._compile(operands[0], scope, False, code)
+        alternative_jump = code.emit(JUMP_IF_FALSE)
+        self._compile(operands[1], scope, tail, code)
+        # Code in tail position is always followed by RETURN, so the
+        # consequent can return directly instead of jumping there.
+        end_jump = code.emit(RETURN if tail else JUMP)
+        code.patch(alternative_jump, code.here())
+        if len(operands) > 2:
+            self._compile(operands[2], scope, tail, code)
+        else:
+            code.emit(CONST, code.constant(None))
+        if not tail:
+            code.patch(end_jump, code.here())
+
+    def _compile_and(self, operands, scope, tail, code):
+        self._compile_junction(operands, scope, JUMP_IF_FALSE_OR_POP, code)
+
+    def _compile_or(self, operands, scope, tail, code):
+        self._compile_junction(operands, scope, JUMP_IF_TRUE_OR_POP, code)
+
+    def _compile_quote(self, operands, scope, tail, code):
+        code.emit(CONST, code.constant(_quoted(operands[0])))
+
+    def _compile_junction(self, operands, scope, opcode, code):
+        jumps = []
+        for operand in operands[:-1]:
+            self._compile(operand, scope, False, code)
+            jumps.append(code.emit(opcode))
+        self._compile(operands[-1], scope, False, code)
+        for position in jumps:
+            code.patch(position, code.here())
+        code.emit(FALSE_IF_NOT)
+
+    def run(self, code, frame):
+        """Run code with frame and return the result."""
+
+        profiler = self.env.profiler
+        if profiler is None:
+            return self._run(code, frame)
+        # The applications ended by an error never reach their
+        # PROFILE_RETURN
+        depth = len(profiler.stack)
+        try:
+            return self._run(code, frame)
+        except:
+            profiler.unwind(depth)
+            raise
+
+    def _run(self, code, frame):
+        env = self.env
+        profiler = env.profiler
+        limits = env.limits
+        max_depth = self.max_depth
+        if limits is not None and limits.max_depth is not None and \
+                (max_depth is None or limits.max_depth < max_depth):
+            max_depth = limits.max_depth
+        stack = []
+        # Continuations of the pending applications, as tuples of
+        # code, position and frame to return to.  A memoized
+        # application pushes None, the MemoizedProcedure and the key
+        # as well, to store the result when it returns.
+        calls = []
+        instructions = code.instructions
+        constants = code.constants
+        pc = 0
+
+        while True:
+            op = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+
+            if op == LOAD_LOCAL:
+                stack.append(frame.values[arg])
+            elif op == LOAD_GLOBAL:
+                name = constants[arg]
+                try:
+                    stack.append(env.namespace[name])
+                except KeyError:
+                    stack.append(env.lookup(name))
+            elif op == CONST:
+                stack.append(constants[arg])
+            elif op == BINARY_CALL or op == CALL or op == TAIL_CALL or \
+                    op == PROFILE_TAIL_CALL:
+                if op == BINARY_CALL:
+                    # The two operands are on the stack.  If the global
+                    # name is still bound to the builtin it was compiled
+                    # for, apply its binary function, otherwise make the
+                    # call that would have been compiled without it.
+                    name, builtin, binary, op = constants[arg]
+                    try:
+                        f = env.namespace[name]
+                    except KeyError:
+                        f = env.lookup(name)
+                    if f is builtin:
+                        right = stack.pop()
+                        stack[-1] = binary(stack[-1], right)
+                        continue
+                    stack.insert(len(stack) - 2, f)
+                    arg = 2
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+                f = stack.pop()
+                memoized = None
+                if f.__class__ is MemoizedProcedure:
+                    # Answered from the cache, or the procedure is
+                    # applied and its result stored on return
+                    key = f.key(args)
+                    try:
+                        stack.append(f.cached(key))
+                        continue
+                    except KeyError:
+                        memoized = f
+                    except TypeError:
+                        pass
+                    f = f.procedure
+                if f.__class__ is Procedure:
+                    f_code = f.machine_code or self._procedure_code(f)
+                else:
+                    f_code = None
+                if f_code is None:
+                    result = f.apply(env, args)
+                    if memoized is not None:
+                        memoized.store(key, result)
+                    stack.append(result)
+                    continue
+
+                if len(args) != len(f.parameters):
+                    raise ArityError('expected %d arguments, got %d' %
+                                     (len(f.parameters), len(args)))
+                if op == CALL or memoized is not None:
+                    if max_depth is not None and len(calls) >= max_depth:
+                        raise RecursionDepthError(
+                            'maximum recursion depth %d exceeded' %
+                            max_depth)
+                    if op == CALL:
+                        calls.append((code, pc, frame))
+                    if memoized is not None:
+                        calls.append((None, memoized, key))
+                if op == PROFILE_TAIL_CALL:
+                    profiler.exit()
+                code = f_code
+                if code.defines:
+                    args.extend([_UNASSIGNED] * code.defines)
+                frame = Frame(args, f.frame)
+                instructions = code.instructions
+                constants = code.constants
+                pc = 0
+            elif op == RETURN:
+                if not calls:
+                    return stack.pop()
+                code, pc, frame = calls.pop()
+                while code is None:
+                    pc.store(frame, stack[-1])
+                    if not calls:
+                        return stack.pop()
+                    code, pc, frame = calls.pop()
+                instructions = code.instructions
+                constants = code.constants
+            elif op == JUMP_IF_FALSE:
+                if not stack.pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == POP:
+                stack.pop()
+            elif op == LOAD_DEREF:
+                depth, index, name = constants[arg]
+                f = frame
+                for _ in xrange(depth):
+                    f = f.parent
+                value = f.values[index]
+                if value is _UNASSIGNED:
+                    raise SymbolError('%s unassigned' % name)
+                stack.append(value)
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if not stack[-1]:
+                    pc = arg
+                else:
+                    stack.pop()
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    stack.pop()
+            elif op == FALSE_IF_NOT:
+                if not stack[-1]:
+                    stack[-1] = False
+            elif op == MAKE_PROCEDURE:
+                body, body_code, scope = constants[arg]
+                f = Procedure(body, parameters=body_code.parameters,
+                              env=env, frame=frame, name=body_code.name,
+                              scope=scope)
+                f.machine_code = body_code
+                f.defines = body_code.defines
+                stack.append(f)
+            elif op == DEFINE_GLOBAL:
+                name = constants[arg]
+                env.namespace[name] = stack[-1]
+                stack[-1] = name
+            elif op == DEFINE_LOCAL:
+                frame.values[arg] = stack.pop()
+            elif op == SPECIAL_FORM:
+                handler, operands = constants[arg]
+                stack.append(handler(operands))
+            elif op == PROFILE_ENTER:
+                profiler.enter(constants[arg])
+            elif op == CHECK_LIMITS:
+                checked = constants[arg]
+                checked._countdown -= 1
+                if checked._countdown <= 0:
+                    checked._check()
+            elif op == PROFILE_RETURN:
+                profiler.exit()
+                if not calls:
+                    return stack.pop()
+                code, pc, frame = calls.pop()
+                while code is None:
+                    pc.store(frame, stack[-1])
+                    if not calls:
+                        return stack.pop()
+                    code, pc, frame = calls.pop()
+                instructions = code.instructions
+                constants = code.constants
+            else:
+                raise ValueError('unknown opcode %r' % op)
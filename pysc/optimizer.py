@@ -0,0 +1,247 @@
+from environment import Expression, Scope, SymbolError
+
+
+class Optimizer(object):
+
+    """Simplify expressions before they are evaluated.
+
+    Applications of pure builtin procedures to constant operands are
+    replaced by their value, and if, cond, and and or are reduced to
+    the parts that can still be evaluated when their tests are
+    constant.  The rest of the expressions is left as it is, and
+    expressions which are not changed are returned unchanged.
+
+    A builtin is only folded where its name refers to the global
+    binding in the environment, and not to a parameter or an
+    internal define, and only if the name is not defined anywhere in
+    the expressions optimized so far.  optimize_all() takes the
+    definitions of all the expressions into account before changing
+    any of them.  Expressions given one at a time to optimize() can't
+    know about definitions in later ones, so only the applications
+    evaluated right away are folded there, and not those in the
+    bodies of procedures, which may run after a builtin is redefined.
+
+    Errors raised by a builtin, such as division by zero, are not
+    raised when optimizing.  The application is left unchanged to
+    raise them when evaluated.
+
+    Public methods:
+    optimize() -- return optimized top level expression
+    optimize_all() -- return list of optimized top level expressions
+
+    Instance variables:
+    env -- Environment holding the builtins
+    protected -- set of global names which are never folded
+
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.protected = set()
+        # False while optimizing expressions one at a time
+        self._fold_bodies = True
+        self._forms = {'define': self._optimize_define,
+                       'if': self._optimize_if,
+                       'cond': self._optimize_cond,
+                       'and': self._optimize_and,
+                       'or': self._optimize_or}
+
+    def optimize(self, expr):
+        """Return optimized top level expression."""
+
+        self.protected.update(Scope._defined_names([expr]))
+        self._fold_bodies = False
+        return self._optimize(expr, None)
+
+    def optimize_all(self, exprs):
+        """Return list of optimized top level expressions."""
+
+        exprs = list(exprs)
+        self.protected.update(Scope._defined_names(exprs))
+        self._fold_bodies = True
+        return [self._optimize(expr, None) for expr in exprs]
+
+    def _optimize(self, expr, scope):
+        if expr.type_ != Expression.COMBINATION or not expr.contents:
+            return expr
+
+        fields = expr.contents
+        first = fields[0]
+        if first.type_ == Expression.NAME and \
+                first.contents in self.env.special_forms:
+            method = self._forms.get(first.contents)
+            if method is None:
+                # Other special forms may use their operands as data
+                return expr
+            return method(expr, scope)
+
+        fields = [self._optimize(field, scope) for field in fields]
+        folded = self._fold(fields, scope)
+        if folded is not None:
+            return folded
+        return _combination(expr, fields)
+
+    def _fold(self, fields, scope):
+        """Return constant Expression with the value of application
+        fields, or None if it can't be computed in advance."""
+
+        for operand in fields[1:]:
+            if operand.type_ != Expression.CONSTANT:
+                return None
+        procedure = self._pure_builtin(fields[0], scope)
+        if procedure is None:
+            return None
+        try:
+            value = procedure.apply(
+                self.env, [operand.contents for operand in fields[1:]])
+        except Exception:
+            return None
+        return Expression(value, Expression.CONSTANT)
+
+    def _pure_builtin(self, expr, scope):
+        """Return pure builtin procedure named by expr, or None."""
+
+        if expr.type_ != Expression.NAME:
+            return None
+        name = expr.contents
+        if name in self.protected:
+            return None
+        if scope is not None and (not self._fold_bodies or
+                                  scope.resolve(name) is not None):
+            return None
+        try:
+            value = self.env.lookup(name)
+        except SymbolError:
+            return None
+        if not getattr(value, 'pure', False):
+            return None
+        return value
+
+    def _optimize_define(self, expr, scope):
+        fields = expr.contents
+        if len(fields) < 3:
+            return expr
+        target = fields[1]
+        if target.type_ == Expression.COMBINATION:
+            parameters = [x.contents for x in target.contents[1:]]
+            body = fields[2:]
+            body_scope = Scope.for_body(parameters, body, scope)
+            body = [self._optimize(x, body_scope) for x in body]
+        else:
+            body = [self._optimize(x, scope) for x in fields[2:]]
+        return _combination(expr, fields[:2] + body)
+
+    def _optimize_if(self, expr, scope):
+        fields = expr.contents
+        if not 3 <= len(fields) <= 4:
+            return expr
+        fields = [fields[0]] + [self._optimize(x, scope) for x in fields[1:]]
+        predicate = fields[1]
+        if predicate.type_ != Expression.CONSTANT:
+            return _combination(expr, fields)
+        if predicate.contents:
+            return fields[2]
+        if len(fields) == 4:
+            return fields[3]
+        return Expression(None, Expression.CONSTANT)
+
+    def _optimize_cond(self, expr, scope):
+        fields = expr.contents
+        clauses = []
+        for case in fields[1:]:
+            if case.type_ != Expression.COMBINATION or len(case.contents) < 2:
+                # Ill-formed, left to raise an error when evaluated
+                return expr
+            predicate = case.contents[0]
+            body = [self._optimize(x, scope) for x in case.contents[1:]]
+            if predicate.type_ == Expression.NAME and \
+                    predicate.contents == 'else':
+                clauses.append(_combination(case, [predicate] + body))
+                break
+            predicate = self._optimize(predicate, scope)
+            if predicate.type_ != Expression.CONSTANT:
+                clauses.append(_combination(case, [predicate] + body))
+            elif predicate.contents:
+                # Always chosen, so no later clause can be
+                clauses.append(Expression([Expression('else')] + body,
+                                          Expression.COMBINATION))
+                break
+
+        if not clauses:
+            return Expression(None, Expression.CONSTANT)
+        only = clauses[0].contents
+        if len(clauses) == 1 and len(only) == 2 and \
+                only[0].type_ == Expression.NAME and only[0].contents == 'else':
+            return only[1]
+        return _combination(expr, fields[:1] + clauses)
+
+    def _optimize_and(self, expr, scope):
+        return self._optimize_junction(expr, scope, False)
+
+    def _optimize_or(self, expr, scope):
+        return self._optimize_junction(expr, scope, True)
+
+    def _optimize_junction(self, expr, scope, stop_value):
+        """Optimize and, if stop_value is False, or or if it is True.
+
+        Evaluation stops at the first operand whose truth value is
+        stop_value.  Constant operands with the other truth value
+        don't change the result unless they are last, and operands
+        after a constant stop_value are never evaluated.
+
+        """
+
+        fields = expr.contents
+        if len(fields) < 2:
+            return expr
+        operands = [self._optimize(x, scope) for x in fields[1:]]
+        kept = []
+        for i, operand in enumerate(operands):
+            if operand.type_ == Expression.CONSTANT:
+                if bool(operand.contents) == stop_value:
+                    kept.append(operand)
+                    break
+                if i < len(operands) - 1:
+                    continue
+            kept.append(operand)
+
+        if len(kept) == 1 and kept[0].type_ == Expression.CONSTANT:
+            value = kept[0].contents
+            if value:
+                return kept[0]
+            return Expression(False, Expression.CONSTANT)
+        return _combination(expr, fields[:1] + kept)
+
+
+def _combination(expr, fields):
+    """Return expr if fields are its own, otherwise a new combination."""
+
+    contents = expr.contents
+    if len(fields) == len(contents) and \
+            all(x is y for x, y in zip(fields, contents)):
+        return expr
+    return Expression(fields, Expression.COMBINATION)
+
+
+def unparse(expr):
+    """Return Scheme source of expr as a string."""
+
+    type_ = expr.type_
+    if type_ == Expression.COMBINATION:
+        return '(%s)' % ' '.join(unparse(x) for x in expr.contents)
+    elif type_ == Expression.NAME:
+        return expr.contents
+
+    value = expr.contents
+    if value is None:
+        # Has no source of its own, but this evaluates to None
+        return '(cond)'
+    elif value is True:
+        return 'true'
+    elif value is False:
+        return 'false'
+    elif isinstance(value, basestring):
+        return '"%s"' % value
+    elif isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,111 @@
+class OutputPort(object):
+
+    """Port collecting writes into larger writes to a stream.
+
+    Writing many small strings, such as each value displayed by a
+    printing loop, to a pipe or file costs a system call each.  An
+    OutputPort keeps them in a list, and writes them to the underlying
+    stream in one call once buffer_size characters have been
+    collected, or when flushed.  When line buffered, which is the
+    default for interactive streams, everything is written as soon as
+    a newline is.
+
+    Output can be sent to another port for a while, which is how
+    with-output-to-string captures what the builtins write.
+
+    Public methods:
+    write() -- write a string
+    flush() -- write everything collected to the stream
+    current() -- return the port output is currently sent to
+    with_output_to() -- call function sending output to another port
+
+    Instance variables:
+    stream -- underlying stream
+    buffer_size -- number of characters collected before writing them
+    line_buffered -- True if writing a newline flushes
+
+    """
+
+    def __init__(self, stream, buffer_size=65536, line_buffered=None):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        if line_buffered is None:
+            line_buffered = self.isatty()
+        self.line_buffered = line_buffered
+        self._chunks = []
+        self._size = 0
+        # Port output is sent to instead, or None
+        self._target = None
+
+    def write(self, data):
+        if self._target is not None:
+            self._target.write(data)
+            return
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self.buffer_size or \
+                (self.line_buffered and '\n' in data):
+            self.flush()
+
+    def flush(self):
+        if self._chunks:
+            self.stream.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+        flush = getattr(self.stream, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def isatty(self):
+        isatty = getattr(self.stream, 'isatty', None)
+        return isatty is not None and isatty()
+
+    def current(self):
+        """Return the port output is sent to, this one unless
+        with_output_to() is running."""
+
+        if self._target is not None:
+            return self._target
+        return self
+
+    def with_output_to(self, port, function):
+        """Call function with the output written to this port sent
+        to port instead, and return its value."""
+
+        previous = self._target
+        self._target = port
+        try:
+            return function()
+        finally:
+            self._target = previous
+
+    def __reduce__(self):
+        # A copy would write to a copy of the stream, if at all
+        raise TypeError("can't store an output port")
+
+
+class StringPort(object):
+
+    """Port collecting output into a string.
+
+    Public methods:
+    write() -- write a string
+    flush() -- do nothing, the output is always available
+    getvalue() -- return everything written
+
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(data)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self._chunks)
+
+    def __reduce__(self):
+        raise TypeError("can't store an output port")
@@ -0,0 +1,252 @@
+"""Mapping procedures over lists in worker processes.
+
+Everything an Environment evaluates runs in one process, so Scheme
+code uses a single CPU however many there are.  pmap and pfor-each
+apply a procedure to the elements of lists like map, but send the
+applications to a pool of worker processes, for procedures doing
+enough work on each element to be worth sending, such as the trials
+of a Monte Carlo simulation.
+
+The procedure is sent the way an image stores values, together with
+the global bindings of its environment, which each worker loads into
+an environment of its own.  The workers are kept for the next call,
+and only load the bindings again when they have changed, so that the
+procedures in them are not analyzed again either.  Bindings which
+can't be stored, such as ports, are left out; if the procedure turns
+out to need one of them, the rest of the list is mapped in this
+process.  The elements are sent in a few
+chunks per worker, so that each message carries many applications,
+and the results come back in the order of the elements.  What the
+procedure writes is collected in the worker and written to the output
+port in order as well.  Anything else it changes only changes the
+copies in the worker, so the procedure should be pure apart from its
+output.  Each worker seeds random on its own, so that the workers
+don't all draw the same numbers.  If the environment has limits, each
+worker is given the steps, time and depth left, and the steps the
+workers take are counted here as they finish.
+
+Short lists, procedures or elements which can't be stored, and
+applications within a worker process are mapped in this process
+instead.  close() ends the workers, which otherwise end with this
+process.
+
+"""
+
+import random
+import hashlib
+import itertools
+import multiprocessing
+import image
+from environment import Environment, Builtins, BuiltinProcedure, \
+    MemoizedProcedure, DummyStream, Pair, SymbolError, make_list
+from output import OutputPort, StringPort
+
+
+# State of a worker process: the port the builtins write to, set by
+# _init_worker(), and the environment with the key of its bindings,
+# the procedure applied and the call it was sent by, set by
+# _apply_chunk()
+_worker = {}
+
+# The pool of workers kept between calls and its number of workers
+_pool = {}
+
+# Numbers telling the calls apart in the workers
+_calls = itertools.count()
+
+
+def _init_worker():
+    random.seed()
+    _worker['port'] = OutputPort(DummyStream(), buffer_size=0)
+
+
+def _apply_chunk(task):
+    """Apply a procedure to each list of arguments in a chunk of
+    task in a worker process.
+
+    task holds the key and stored bindings of the environment, whether
+    any were left out, the number of the call, the stored procedure,
+    the limits and the stored lists of arguments.  Return the values
+    stored the same way, the output and the number of steps taken, or
+    None if the procedure needs a binding left out.
+
+    """
+
+    key, namespace, partial, call, procedure, limits, data = task
+    if _worker.get('key') != key:
+        env = Environment(namespace=Builtins.namespace(_worker['port']))
+        env.namespace.update(image.loads(namespace, env))
+        _worker.update(key=key, environment=env, call=None)
+    env = _worker['environment']
+    if _worker['call'] != call:
+        # Setting limits analyzes the procedures again, so it is
+        # avoided when there are none
+        if limits is not None or env.limits is not None:
+            env.limits = limits
+        _worker['procedure'] = image.loads(procedure, env)
+        _worker['call'] = call
+    procedure = _worker['procedure']
+    output = StringPort()
+    # The limits of the call, counting the steps of all its chunks
+    limits = env.limits
+    steps = limits.steps if limits is not None else 0
+
+    def apply_all():
+        return [procedure.apply(None, args)
+                for args in image.loads(data, env)]
+
+    try:
+        values = _worker['port'].with_output_to(output, apply_all)
+    except SymbolError:
+        if partial:
+            return None
+        raise
+    if limits is not None:
+        steps = limits.steps - steps
+    return image.dumps(values, env), output.getvalue(), steps
+
+
+def _store_namespace(env):
+    """Return the global bindings of env stored by image.dumps(),
+    and whether any were left out as they can't be stored."""
+
+    try:
+        return image.dumps(env.namespace, env), False
+    except image.ImageError:
+        pass
+    # Stored on their own first, to find those which can be
+    namespace = {}
+    for name, value in env.namespace.iteritems():
+        try:
+            image.dumps(value, env)
+        except image.ImageError:
+            continue
+        namespace[name] = value
+    return image.dumps(namespace, env), True
+
+
+def _get_pool(jobs):
+    """Return the pool of workers kept, with jobs workers."""
+
+    if _pool.get('jobs') != jobs:
+        close()
+        _pool['pool'] = multiprocessing.Pool(jobs, _init_worker)
+        _pool['jobs'] = jobs
+    return _pool['pool']
+
+
+def close():
+    """End the workers kept for mapping."""
+
+    pool = _pool.pop('pool', None)
+    _pool.pop('jobs', None)
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+
+def _environment(procedure):
+    """Return the global environment procedure was defined in, or
+    None for a builtin."""
+
+    while isinstance(procedure, MemoizedProcedure):
+        procedure = procedure.procedure
+    if isinstance(procedure, BuiltinProcedure):
+        return None
+    return procedure.env
+
+
+class ParallelBuiltins(object):
+
+    """Builtins applying procedures in worker processes.
+
+    The class variables set how the work is shared out.
+
+    Class variables:
+    jobs -- number of worker processes, None for one per CPU
+    min_items -- smallest number of applications sent to workers
+    chunks_per_job -- number of chunks of applications each worker
+                      is sent
+
+    """
+
+    jobs = None
+    # Starting the workers and sending them the environment takes
+    # longer than mapping a short list.
+    min_items = 64
+    # More chunks share out applications taking uneven time better,
+    # at the cost of more messages.
+    chunks_per_job = 4
+
+    @classmethod
+    def pmap(cls, operands, stream):
+        return make_list(cls.map(operands[0], operands[1:], stream))
+
+    @classmethod
+    def pfor_each(cls, operands, stream):
+        cls.map(operands[0], operands[1:], stream)
+
+    @classmethod
+    def map(cls, procedure, lists, stream):
+        """Return list of the values of procedure applied to the
+        elements of lists in turn, writing its output to stream."""
+
+        arguments = []
+        while all(rest.__class__ is Pair for rest in lists):
+            arguments.append([rest.car for rest in lists])
+            lists = [rest.cdr for rest in lists]
+        jobs = cls.jobs or multiprocessing.cpu_count()
+        # Daemon processes, such as the workers of a pool, can't start
+        # workers of their own.
+        if jobs < 2 or len(arguments) < cls.min_items or \
+                multiprocessing.current_process().daemon:
+            return [procedure.apply(None, args) for args in arguments]
+
+        env = _environment(procedure)
+        if env is None:
+            env = Environment(namespace=Builtins.namespace(stream))
+        limits = env.limits
+        size = -(-len(arguments) // (jobs * cls.chunks_per_job))
+        try:
+            namespace, partial = _store_namespace(env)
+            task = (hashlib.sha1(namespace).digest(), namespace, partial,
+                    next(_calls), image.dumps(procedure, env),
+                    limits.remaining() if limits is not None else None)
+            tasks = [task + (image.dumps(arguments[i:i + size], env),)
+                     for i in xrange(0, len(arguments), size)]
+        except image.ImageError:
+            # Values which can't be sent, such as ports, are only
+            # usable here.
+            return [procedure.apply(None, args) for args in arguments]
+        values = []
+        try:
+            results = _get_pool(jobs).imap(_apply_chunk, tasks)
+            for i, result in enumerate(results):
+                if result is None:
+                    # The workers still busy are ended with the pool
+                    close()
+                    values.extend(procedure.apply(None, args)
+                                  for args in arguments[i * size:])
+                    break
+                data, output, steps = result
+                if output:
+                    stream.write(output)
+                if limits is not None:
+                    limits.add_steps(steps)
+                values.extend(image.loads(data, env))
+        except:
+            # Workers may still be applying the rest
+            close()
+            raise
+        return values
+
+
+def namespace(outstream):
+    """Return dictionary of the parallel builtins by name, writing
+    output to port outstream."""
+
+    cls = ParallelBuiltins
+    return {
+        'pmap': BuiltinProcedure(cls.pmap, True, outstream),
+        'pfor-each': BuiltinProcedure(cls.pfor_each, True, outstream)
+    }
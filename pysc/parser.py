@@ -1,6 +1,11 @@
+import os
 import sys
 import re
+import mmap
+import stat
 import StringIO
+import cStringIO
+from fractions import Fraction
 from environment import Expression
 
 
@@ -15,23 +20,79 @@ class Parser(object):
     into Scheme expressions.
 
     The classmethod from_string() can be used if the input is
-    available as a string.
+    available as a string, and from_file() to load a source file
+    non-interactively.
+
+    Input is read in chunks of chunk_size characters from files and
+    strings, as much as is available up to chunk_size from pipes, or
+    a line at a time from terminals and any other stream, and split
+    into tokens with a regular expression.
     """
 
+    # Matches the next token, skipping whitespace and comments before
+    # it.  Newlines are tokens, to aid interactive terminals.
+    _token = re.compile(r"""
+        [^\S\n]*                 # Whitespace, except newlines
+        (?:;[^\n]*)?             # Comment, up to the newline
+        ([()'\n]                 # Parenthesis, quote or newline
+         |"[^"]*"                # String constant
+         |[^\s()";'][^\s()]*    # Any other token
+        )?""", re.VERBOSE)
+
+    # Like _token, but for input which is not interactive, where
+    # newlines are skipped like any other whitespace.
+    _batch_token = re.compile(r"""
+        (?:\s+|;[^\n]*)*         # Whitespace and comments
+        ([()']                   # Parenthesis or quote
+         |"[^"]*"                # String constant
+         |[^\s()";'][^\s()]*    # Any other token
+        )?""", re.VERBOSE)
+
+    chunk_size = 65536
+
+    # Number of shared names and constants kept before starting over,
+    # so that long input with many different constants is parsed in
+    # bounded memory.
+    max_atoms = 10000
+
     def __init__(self, stream, output=None, prompt1=None, prompt2=None):
         """Create parser connected to specified stream.
 
-        output -- stream to output prompt on (default None)
+        output -- stream to output prompt on, flushed before waiting
+                  for input from anything but a file or string
+                  (default None)
         prompt1 -- prompt for each new expression (default None)
         prompt2 -- prompt for unfinished expressions (default None)
 
         """
 
-        self.push_back = None
         self.stream = stream
         self.output = output
         self.prompt1 = prompt1
         self.prompt2 = prompt2
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        # Expressions of the names and constants seen so far, by
+        # token, shared by all their occurrences.
+        self.atoms = {}
+        isatty = getattr(stream, 'isatty', None)
+        self.interactive = isatty is not None and isatty()
+        # Reading a chunk from a pipe would wait until all of it has
+        # been written, so only whole files and strings are read in
+        # chunks.  A pipe is read through its file descriptor instead,
+        # which returns what is available.
+        self._chunked = False
+        self._fd = None
+        if not self.interactive and stream is not None:
+            if isinstance(stream, (StringIO.StringIO, cStringIO.InputType)):
+                self._chunked = True
+            else:
+                self._fd = _file_descriptor(stream)
+                if self._fd is not None and \
+                        stat.S_ISREG(os.fstat(self._fd).st_mode):
+                    self._chunked = True
+                    self._fd = None
 
     def _to_constant(self, primitive):
         """Attempt to convert primitive to constant.
@@ -44,8 +105,50 @@ class Parser(object):
         if primitive[0] == '"':
             assert primitive[-1] == '"'
             return primitive[1:-1]
+        if '/' in primitive:
+            numerator, denominator = primitive.split('/', 1)
+            denominator = int(denominator)
+            if not denominator:
+                raise ValueError('zero denominator')
+            value = Fraction(int(numerator), denominator)
+            if value.denominator == 1:
+                return value.numerator
+            return value
         return float(primitive) if '.' in primitive else int(primitive)
 
+    def _fill(self):
+        """Read more input into the buffer.
+
+        Already consumed input is dropped from the buffer.  Return
+        False if the stream is exhausted.
+
+        """
+
+        if self.eof:
+            return False
+        if self._chunked:
+            # Read at least as much as is left in the buffer, so that
+            # a long token spanning many chunks is not scanned again
+            # once per chunk.
+            data = self.stream.read(max(self.chunk_size,
+                                        len(self.buffer) - self.pos))
+        else:
+            # The answers to the input so far may be waited for
+            # before more is sent
+            if self.output is not None:
+                self.output.flush()
+            if self._fd is not None:
+                data = os.read(self._fd, self.chunk_size)
+            else:
+                # Don't block waiting for more than a line
+                data = self.stream.readline()
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
     def next_token(self):
         """Return next token from stream as a string.
 
@@ -53,49 +156,25 @@ class Parser(object):
 
         """
 
-        # If there's a character in self.push_back, use it.  Otherwise
-        # read the next one from the stream.
-        if self.push_back is not None:
-            c = self.push_back
-            self.push_back = None
-        else:
-            c = self.stream.read(1)
-
-        # Read up until the first non-whitespace character, but
-        # exclude newlines from characters to skip, as they will be
-        # returned as tokens.  This is to aid interactive terminals.
-        while c.isspace() and c != '\n':
-            c = self.stream.read(1)
-
-        # Skip rest of line if a comment is found
-        if c == ';':
-            while c != '' and c != '\n':
-                c = self.stream.read(1)
-
-        # Parentheses and newlines are special, return them
-        # immediately if found.
-        if c == '(' or c == ')' or c == '\n':
-            token = c
-        elif c == '"':
-            # Start a string constant
-            token = '"'
-            c = self.stream.read(1)
-            while c != '"':
-                token += c
-                c = self.stream.read(1)
-            token += '"'
-        else:
-            token = ''
-            # Build up the token until a whitespace or parenthesis are
-            # found
-            while not c.isspace() and len(c) > 0 and c != '(' and c != ')':
-                token += c
-                c = self.stream.read(1)
-            # Push next character back so that it will be read at next
-            # call
-            self.push_back = c
-
-        return token if token != '' else None
+        while True:
+            match = self._token.match(self.buffer, self.pos)
+            token = match.group(1)
+            end = match.end()
+            if end < len(self.buffer):
+                if token is not None:
+                    break
+                # Nothing but an unterminated string constant fails
+                # to match before the end of the buffer.
+                if not self._fill():
+                    raise ParseError("Unexpected: EOF")
+            elif token is not None and token[0] in '()\'\n"':
+                # These tokens can't continue in the next chunk
+                break
+            elif not self._fill():
+                break
+
+        self.pos = end
+        return token
 
     def _get_next_expr(self, prompt):
         """Return next expression from input stream.
@@ -111,6 +190,7 @@ class Parser(object):
         while token == '\n':
             if prompt:
                 self.output.write(prompt)
+                self.output.flush()
             token = self.next_token()
 
         if token == '(':
@@ -134,23 +214,39 @@ class Parser(object):
         elif token == ')':
             # A single closing parenthesis is an invalid expression
             raise ParseError("Unexpected: ')'")
+        elif token == "'":
+            # 'datum is short for (quote datum)
+            datum = self._get_next_expr(self.prompt2)
+            if datum is None:
+                raise ParseError("Unexpected: EOF")
+            quote = self.atoms.get('quote')
+            if quote is None:
+                quote = self.atoms['quote'] = Expression('quote')
+            expr = Expression([quote, datum], Expression.COMBINATION)
         elif token is None:
             expr = None
         else:
-            try:
-                const = self._to_constant(token)
-                expr = Expression(const, Expression.CONSTANT)
-            except ValueError:
-                expr = Expression(token, Expression.NAME)
+            expr = self.atoms.get(token)
+            if expr is None:
+                try:
+                    const = self._to_constant(token)
+                    expr = Expression(const, Expression.CONSTANT)
+                except ValueError:
+                    expr = Expression(intern(token), Expression.NAME)
+                self.atoms[token] = expr
 
         return expr
 
     def expressions(self):
         """Return all expressions in stream as a generator."""
 
+        atoms = self.atoms
         expr = self._get_next_expr(self.prompt1)
         while expr is not None:
             yield expr
+            if len(atoms) > self.max_atoms:
+                # Only later expressions stop sharing with earlier ones
+                atoms.clear()
             expr = self._get_next_expr(self.prompt1)
 
     @classmethod
@@ -164,3 +260,49 @@ class Parser(object):
         stream = StringIO.StringIO(string)
         parser = Parser(stream)
         return list(parser.expressions())
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Return Parser reading all input from buffer.
+
+        buffer is a string, or any object supporting the buffer
+        interface such as an mmap object, holding the complete input.
+        It is tokenized without reading from any stream, and newlines
+        are not returned as tokens since there are no prompts.
+        """
+
+        parser = cls(None)
+        parser.buffer = buffer
+        parser.eof = True
+        parser._token = cls._batch_token
+        return parser
+
+    @classmethod
+    def from_file(cls, filename):
+        """Return all expressions in file as a generator.
+
+        The file is memory-mapped, or read in one call if that isn't
+        possible, and parsed with from_buffer().
+        """
+
+        with open(filename, 'rb') as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # Empty files and pipes can't be mapped
+                buffer = f.read()
+            try:
+                for expr in cls.from_buffer(buffer).expressions():
+                    yield expr
+            finally:
+                if isinstance(buffer, mmap.mmap):
+                    buffer.close()
+
+
+def _file_descriptor(stream):
+    """Return file descriptor of stream, or None if it has none."""
+
+    try:
+        return stream.fileno()
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
@@ -0,0 +1,262 @@
+import json
+import time
+import signal
+import collections
+from environment import BuiltinProcedure
+
+
+class ProcedureStats(object):
+
+    """Profile of one procedure.
+
+    Instance variables:
+    name -- name of the procedure
+    calls -- number of applications
+    inclusive -- time spent in the procedure, including procedures
+                 it called, counting recursive applications once
+    exclusive -- time spent in the procedure itself
+    depth -- number of applications currently running
+    max_depth -- largest number of nested applications
+
+    """
+
+    __slots__ = ('name', 'calls', 'inclusive', 'exclusive', 'depth',
+                 'max_depth')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.depth = 0
+        self.max_depth = 0
+
+    def as_dict(self):
+        return {'name': self.name, 'calls': self.calls,
+                'inclusive': self.inclusive, 'exclusive': self.exclusive,
+                'max_depth': self.max_depth}
+
+
+class Profiler(object):
+
+    """Record how often and for how long procedures run.
+
+    Nothing is timed by default.  Setting an Environment's profiler
+    attribute makes it time the named procedures analyzed after that,
+    and instrument() makes the builtins of a namespace timed, so
+    there is no cost at all when not profiling.
+
+    The running applications are kept on a stack, so that the time of
+    an application can be subtracted from the exclusive time of its
+    caller.  An application making a tail call ends there, just as
+    its frame is not kept, and the called procedure is counted as
+    called by the caller of the application.  The depth of a
+    procedure is therefore the depth of its recursion as far as it
+    needs stack space.
+
+    Public methods:
+    wrap() -- return function timed as the named procedure
+    instrument() -- time the builtins in a namespace
+    enter() -- record start of an application
+    exit() -- record end of the latest application
+    unwind() -- end applications left running by an error
+    results() -- return stats of all procedures, slowest first
+    report() -- write a table of the results
+    write() -- write the results as JSON
+
+    Instance variables:
+    timer -- function returning the current time in seconds
+    stats -- dictionary of ProcedureStats by procedure name
+    stack -- list of the running applications
+
+    """
+
+    def __init__(self, timer=time.time):
+        self.timer = timer
+        self.stats = {}
+        self.stack = []
+
+    def wrap(self, name, function):
+        """Return function recording each call as an application."""
+
+        enter = self.enter
+        exit = self.exit
+
+        def profiled(*args):
+            enter(name)
+            try:
+                return function(*args)
+            finally:
+                exit()
+        return profiled
+
+    def instrument(self, namespace):
+        """Time the named builtins bound in namespace."""
+
+        for value in namespace.itervalues():
+            if isinstance(value, BuiltinProcedure) and value.name:
+                value.function = self.wrap(value.name, value.function)
+                if value.binary is not None:
+                    value.binary = self.wrap(value.name, value.binary)
+
+    def enter(self, name):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = ProcedureStats(name)
+        stats.calls += 1
+        stats.depth += 1
+        if stats.depth > stats.max_depth:
+            stats.max_depth = stats.depth
+        # Each entry holds the stats, start time and the time spent in
+        # applications made by it.
+        self.stack.append([stats, self.timer(), 0.0])
+
+    def exit(self):
+        stats, start, children = self.stack.pop()
+        elapsed = self.timer() - start
+        stats.depth -= 1
+        if not stats.depth:
+            stats.inclusive += elapsed
+        stats.exclusive += elapsed - children
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def unwind(self, depth):
+        """End the applications running above depth of the stack."""
+
+        while len(self.stack) > depth:
+            self.exit()
+
+    def results(self):
+        """Return list of ProcedureStats by decreasing exclusive time."""
+
+        return sorted(self.stats.itervalues(),
+                      key=lambda stats: (-stats.exclusive, stats.name))
+
+    def report(self, stream):
+        """Write results as a table to stream."""
+
+        stream.write('%9s %11s %11s %9s  %s\n' %
+                     ('calls', 'inclusive', 'exclusive', 'depth', 'name'))
+        for stats in self.results():
+            stream.write('%9d %11.6f %11.6f %9d  %s\n' %
+                         (stats.calls, stats.inclusive, stats.exclusive,
+                          stats.max_depth, stats.name))
+
+    def write(self, filename):
+        """Write results to file as a JSON list of objects."""
+
+        with open(filename, 'w') as f:
+            json.dump([stats.as_dict() for stats in self.results()], f,
+                      indent=1, sort_keys=True)
+            f.write('\n')
+
+
+class SamplingProfiler(object):
+
+    """Record the Scheme call stack at regular intervals.
+
+    Used in place of a Profiler, with the same hooks, to keep a shadow
+    stack of the names of the running procedures.  While started, a
+    profiling timer signal makes it count the current stack every
+    interval seconds of CPU time.  Unlike Profiler, nothing is timed
+    per application, and builtins are not tracked, so time spent in
+    them counts for the procedure applying them.
+
+    Tail calls replace the application making them on the stack, so a
+    loop written as a tail recursive procedure shows up as a single
+    frame.
+
+    Only one SamplingProfiler can be started at a time, and only in
+    the main thread, since it uses the SIGPROF signal.  The timer is
+    usually less precise than interval, so that samples are taken less
+    often than that.
+
+    Public methods:
+    start() -- start taking samples
+    stop() -- stop taking samples
+    sample() -- count the current stack
+    collapsed() -- return the samples as collapsed stacks
+    write() -- write the collapsed stacks to a file
+
+    Instance variables:
+    interval -- seconds between samples
+    stack -- list of the names of the running procedures
+    samples -- Counter of sampled stacks, as tuples of names
+
+    """
+
+    # Frame of samples taken outside of any procedure
+    TOP_LEVEL = '<top level>'
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stack = []
+        self.samples = collections.Counter()
+        self._previous_handler = None
+
+    def wrap(self, name, function):
+        """Return function keeping name on the stack while called."""
+
+        push = self.stack.append
+        pop = self.stack.pop
+
+        def sampled(*args):
+            push(name)
+            try:
+                return function(*args)
+            finally:
+                pop()
+        return sampled
+
+    def instrument(self, namespace):
+        """Do nothing, builtins are not tracked."""
+
+    def enter(self, name):
+        self.stack.append(name)
+
+    def exit(self):
+        self.stack.pop()
+
+    def unwind(self, depth):
+        """Remove the applications above depth of the stack."""
+
+        del self.stack[depth:]
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF,
+                                               self._handle_signal)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler)
+
+    def _handle_signal(self, signum, frame):
+        self.sample()
+
+    def sample(self):
+        self.samples[tuple(self.stack)] += 1
+
+    def collapsed(self):
+        """Return list of lines of stacks with their sample counts.
+
+        Each line has the names in a stack, outermost first, separated
+        by semicolons and followed by the number of samples, as read
+        by flame graph tools.
+
+        """
+
+        lines = []
+        for stack, count in self.samples.iteritems():
+            frames = ';'.join((self.TOP_LEVEL,) + stack)
+            lines.append('%s %d' % (frames, count))
+        lines.sort()
+        return lines
+
+    def write(self, filename):
+        """Write collapsed stacks to file."""
+
+        with open(filename, 'w') as f:
+            for line in self.collapsed():
+                f.write(line + '\n')
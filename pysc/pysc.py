@@ -1,6 +1,18 @@
 import sys
+import argparse
+import traceback
+import StringIO
+import cStringIO
+import multiprocessing
 from parser import Parser
+from cache import ParseCache
 from environment import Environment, Builtins, Expression
+from machine import Machine
+from optimizer import Optimizer, unparse
+from profiler import Profiler, SamplingProfiler
+from limits import Limits, LimitExceeded
+from output import OutputPort
+import image
 
 
 class Interpreter(object):
@@ -10,11 +22,19 @@ class Interpreter(object):
 
     Public methods:
     run() -- Run interpreter by evaluating expressions
+    load() -- Evaluate all expressions in a file
+    load_image() -- Bind the values saved in an image file
+    save_image() -- Save the global bindings to an image file
 
     """
 
+    ENGINES = ('analyzer', 'machine')
+    FLUSH_POLICIES = ('line', 'block')
+
     def __init__(self, instream=sys.stdin, outstream=sys.stdout,
-                 prompt1=None, prompt2=None):
+                 prompt1=None, prompt2=None, engine='analyzer',
+                 max_depth=None, optimize=False, profiler=None,
+                 limits=None, flush=None, buffer_size=65536):
         """Create Interpreter object.
 
         Prepare interpreter for running by specifying the streams to
@@ -31,11 +51,50 @@ class Interpreter(object):
         and outstream return True for isatty().  This can be
         overridden by just specifying a prompt explicitly.
 
+        engine selects how expressions are evaluated.  With
+        'analyzer' they are analyzed into Python closures by the
+        Environment, which is usually fastest.  With 'machine' they
+        are compiled to bytecode run by a machine.Machine, which keeps
+        its own stack so that deep non-tail recursion is limited by
+        memory instead of by the Python stack.  max_depth then limits
+        the number of nested procedure applications.
+
+        If optimize is true, expressions are simplified by an
+        optimizer.Optimizer before they are evaluated.
+
+        If a profiler.Profiler is given, the builtins and all
+        procedures defined are timed by it.  A
+        profiler.SamplingProfiler can be given instead, to keep track
+        of the running procedures.
+
+        If limits.Limits are given, each expression evaluated is
+        stopped with a limits.LimitExceeded error once it exceeds
+        them.
+
+        The results, and everything written by the builtins, are
+        collected by an output.OutputPort and written to outstream
+        in larger pieces.  flush selects when: 'line' at the end of
+        every line, or 'block' once buffer_size characters have been
+        collected, which is much faster for long runs writing to a
+        file or pipe.  Everything is always written before reading
+        input after a prompt, and once all input is evaluated.
+
         Keyword arguments:
         instream -- stream to read input from (default sys.stdin)
         outstream -- stream to write output to (default sys.stdout)
         prompt1 -- Normal prompt (default '> ' if interactive)
         prompt2 -- Secondary prompt (default None)
+        engine -- 'analyzer' or 'machine' (default 'analyzer')
+        max_depth -- maximum recursion depth of the machine engine
+                     (default None, meaning unlimited)
+        optimize -- fold constant expressions first (default False)
+        profiler -- Profiler or SamplingProfiler to record
+                    applications with (default None)
+        limits -- Limits of each evaluation (default None)
+        flush -- 'line' or 'block' (default 'line' if outstream is
+                 interactive, otherwise 'block')
+        buffer_size -- characters collected before writing them
+                       (default 65536)
 
         """
 
@@ -46,9 +105,30 @@ class Interpreter(object):
             prompt1 = '> '
         self.prompt1 = prompt1
         self.prompt2 = prompt2
-        self.parser = Parser(self.instream, self.outstream,
+        if flush is None:
+            flush = 'line' if outstream.isatty() else 'block'
+        if flush not in self.FLUSH_POLICIES:
+            raise ValueError('unknown flush policy %r' % flush)
+        self.output = OutputPort(outstream, buffer_size,
+                                 line_buffered=flush == 'line')
+        self.parser = Parser(self.instream, self.output,
                              self.prompt1, self.prompt2)
-        self.environment = Environment(namespace=Builtins.namespace(outstream))
+        self.environment = Environment(
+            namespace=Builtins.namespace(self.output))
+        if profiler is not None:
+            profiler.instrument(self.environment.namespace)
+            self.environment.profiler = profiler
+        self.environment.limits = limits
+        if engine == 'machine':
+            self.evaluator = Machine(self.environment, max_depth)
+        elif engine == 'analyzer':
+            self.evaluator = self.environment
+        else:
+            raise ValueError('unknown engine %r' % engine)
+        if optimize:
+            self.optimizer = Optimizer(self.environment)
+        else:
+            self.optimizer = None
 
     def run(self):
         """Run interpreter by evaluating expessions.
@@ -60,20 +140,256 @@ class Interpreter(object):
         """
 
         if self.prompt1:
-            self.outstream.write(self.prompt1)
+            self.output.write(self.prompt1)
+            self.output.flush()
+        expressions = self.parser.expressions()
+        if self.optimizer is not None:
+            expressions = (self.optimizer.optimize(expr)
+                           for expr in expressions)
+        self._evaluate_all(expressions)
+
+    def load(self, filename, cache=None):
+        """Evaluate all expressions in file.
+
+        Works like run(), but instead of reading the input stream the
+        file is parsed in one go by Parser.from_file(), without any
+        prompts.  If a ParseCache is given, the expressions are loaded
+        through it instead.  When optimizing, the whole file is
+        optimized before any of it is evaluated.
+
+        """
+
+        if cache is not None:
+            expressions = cache.load(filename)
+        else:
+            expressions = Parser.from_file(filename)
+        if self.optimizer is not None:
+            expressions = self.optimizer.optimize_all(expressions)
+        self._evaluate_all(expressions)
+
+    def load_image(self, filename):
+        """Bind the values saved in image file by save_image().
+
+        Loading an image is much faster than evaluating the code that
+        made the bindings again.  Raise image.ImageError if the file
+        is not a valid image of this version.
+
+        """
+
+        image.load(self.environment, filename)
+
+    def save_image(self, filename):
+        """Save all global bindings to image file."""
+
+        image.save(self.environment, filename)
+
+    def _evaluate_all(self, expressions):
+        # Expressions are evaluated as they are read and nothing is
+        # kept of them afterwards, so that any length of input runs in
+        # the same memory.
+        write = self.output.write
         try:
-            for expr in self.parser.expressions():
-                result = self.environment.eval(expr)
+            limits = self.environment.limits
+            for expr in expressions:
+                if limits is not None:
+                    limits.reset()
+                result = self.evaluator.eval(expr)
                 if result is not None:
-                    print result
+                    write('%s\n' % (result,))
         except KeyboardInterrupt:
             pass
+        finally:
+            self.output.flush()
 
 
-if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        for file_ in sys.argv[1:]:
-            with open(file_, 'r') as f:
-                Interpreter(f).run()
+# State of a worker process of run_parallel(), set by _init_worker()
+_worker = {}
+
+
+def _init_worker(options, cache_dir, image_file):
+    _worker['options'] = options
+    _worker['cache'] = ParseCache(cache_dir) if cache_dir else None
+    _worker['image_file'] = image_file
+    if image_file is not None:
+        # Read once, and loaded from memory for each file
+        with open(image_file, 'rb') as f:
+            _worker['image'] = f.read()
+
+
+def _run_file(filename):
+    """Run file in a new Interpreter in a worker process.
+
+    Return the output of the file, and the error which stopped it as
+    a string, or None if it ran to the end.
+
+    """
+
+    outstream = StringIO.StringIO()
+    try:
+        # Workers have their standard input closed, and never read it
+        interpreter = Interpreter(StringIO.StringIO(), outstream,
+                                  **_worker['options'])
+        if _worker['image_file'] is not None:
+            image.read(interpreter.environment,
+                       cStringIO.StringIO(_worker['image']),
+                       _worker['image_file'])
+        interpreter.load(filename, _worker['cache'])
+    except (LimitExceeded, image.ImageError) as error:
+        return outstream.getvalue(), 'Error: %s\n' % error
+    except Exception:
+        return outstream.getvalue(), traceback.format_exc()
+    return outstream.getvalue(), None
+
+
+def run_parallel(files, jobs, options, cache_dir=None, image_file=None,
+                 outstream=sys.stdout, errstream=sys.stderr):
+    """Run files in a pool of worker processes and return the
+    number of files that failed.
+
+    Each file is run by a new Interpreter created with the keyword
+    arguments in options, and loaded through a ParseCache in
+    cache_dir if given.  If image_file is given, each worker reads
+    it once, and every file starts with its bindings.
+
+    The output of each file is collected, and written to outstream in
+    the order of files as soon as all files before it are done.  The
+    error stopping a file is written to errstream after its output.
+
+    """
+
+    pool = multiprocessing.Pool(jobs, _init_worker,
+                                (options, cache_dir, image_file))
+    failed = 0
+    try:
+        results = pool.imap(_run_file, files)
+        for filename, (output, error) in zip(files, results):
+            outstream.write(output)
+            outstream.flush()
+            if error is not None:
+                failed += 1
+                errstream.write('%s failed:\n%s' % (filename, error))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return failed
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description='Run Scheme files, or an interactive interpreter if '
+        'no files are given.')
+    arg_parser.add_argument('files', nargs='*', metavar='FILE',
+                            help='Scheme source file to run')
+    arg_parser.add_argument('--cache-dir', metavar='DIR',
+                            help='cache parsed files in DIR')
+    arg_parser.add_argument('--engine', choices=Interpreter.ENGINES,
+                            default='analyzer',
+                            help='how to evaluate expressions '
+                            '(default: %(default)s)')
+    arg_parser.add_argument('--max-depth', type=int, metavar='N',
+                            help='limit the depth of nested procedure '
+                            'applications to N')
+    arg_parser.add_argument('--max-steps', type=int, metavar='N',
+                            help='limit each expression to N procedure '
+                            'applications')
+    arg_parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                            help='limit the time spent evaluating each '
+                            'expression')
+    arg_parser.add_argument('--optimize', action='store_true',
+                            help='fold constant expressions before '
+                            'evaluating them')
+    arg_parser.add_argument('--dump-optimized', action='store_true',
+                            help='print the files as optimized by '
+                            '--optimize instead of running them')
+    arg_parser.add_argument('--flush', choices=Interpreter.FLUSH_POLICIES,
+                            help='write output at the end of every line, '
+                            'or in blocks (default: line if interactive, '
+                            'otherwise block)')
+    arg_parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                            help='run the files in N worker processes')
+    arg_parser.add_argument('--image', metavar='FILE',
+                            help='load the bindings saved in image FILE '
+                            'before running')
+    arg_parser.add_argument('--save-image', metavar='FILE',
+                            help='save the bindings made by the last file '
+                            'run, or the interactive session, to image '
+                            'FILE')
+    profiling = arg_parser.add_mutually_exclusive_group()
+    profiling.add_argument('--profile', metavar='FILE',
+                           help='time the procedures, print a report to '
+                           'standard error and write the results to FILE '
+                           'as JSON')
+    profiling.add_argument('--sample', metavar='FILE',
+                           help='sample the call stack while running and '
+                           'write the collapsed stacks to FILE')
+    args = arg_parser.parse_args(argv)
+    if args.jobs < 1:
+        arg_parser.error('--jobs must be at least 1')
+    if args.jobs > 1 and (args.profile or args.sample or args.save_image):
+        arg_parser.error('--jobs can only be 1 with --profile, --sample '
+                         'or --save-image')
+
+    if args.dump_optimized:
+        optimizer = Optimizer(Environment(namespace=Builtins.namespace()))
+        if args.files:
+            expressions = []
+            for file_ in args.files:
+                expressions.extend(Parser.from_file(file_))
+        else:
+            expressions = Parser(sys.stdin).expressions()
+        for expr in optimizer.optimize_all(expressions):
+            print unparse(expr)
+        return
+
+    if args.profile:
+        profiler = Profiler()
+    elif args.sample:
+        profiler = SamplingProfiler()
+        profiler.start()
     else:
-        Interpreter().run()
+        profiler = None
+    if args.max_depth is None and args.max_steps is None and \
+            args.timeout is None:
+        limits = None
+    else:
+        limits = Limits(args.max_steps, args.timeout, args.max_depth)
+    options = {'engine': args.engine, 'optimize': args.optimize,
+               'profiler': profiler, 'limits': limits, 'flush': args.flush}
+    if args.jobs > 1 and args.files:
+        failed = run_parallel(args.files, args.jobs, options, args.cache_dir,
+                              args.image)
+        if failed:
+            sys.exit('%d of %d files failed' % (failed, len(args.files)))
+        return
+
+    try:
+        if args.files:
+            cache = ParseCache(args.cache_dir) if args.cache_dir else None
+            for file_ in args.files:
+                interpreter = Interpreter(**options)
+                if args.image:
+                    interpreter.load_image(args.image)
+                interpreter.load(file_, cache)
+        else:
+            interpreter = Interpreter(**options)
+            if args.image:
+                interpreter.load_image(args.image)
+            interpreter.run()
+        if args.save_image:
+            interpreter.save_image(args.save_image)
+    except (LimitExceeded, image.ImageError) as error:
+        sys.exit('Error: %s' % error)
+    finally:
+        if args.profile:
+            profiler.report(sys.stderr)
+            profiler.write(args.profile)
+        elif args.sample:
+            profiler.stop()
+            profiler.write(args.sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+from pysc.machine import Machine
+from pysc.parser import Parser
+
+
+class EvaluatorMixin(object):
+
+    """Evaluating Scheme code in test cases.
+
+    setUp() should set the evaluator attribute to the evaluator made
+    by make_evaluator(), an Environment unless MachineMixin is mixed
+    in before this.
+
+    """
+
+    def make_evaluator(self, env):
+        return env
+
+    def eval_string(self, string, evaluator=None):
+        """Return the value of the last expression in string."""
+
+        if evaluator is None:
+            evaluator = self.evaluator
+        result = None
+        for expr in Parser.from_string(string):
+            result = evaluator.eval(expr)
+        return result
+
+
+class MachineMixin(EvaluatorMixin):
+
+    """Evaluating Scheme code in test cases with a Machine, to run the
+    tests of an EvaluatorMixin subclass compiled as well."""
+
+    def make_evaluator(self, env):
+        return Machine(env)
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from fractions import Fraction
+from unittest import TestCase, main
+from pysc.cache import ParseCache
+from pysc.parser import Parser
+
+
+SOURCE = '(define (f x) ; comment\n  (g "a string" 3.14 -2 x))\nsym "s"\n'
+
+
+class test_parse_cache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        self.cache = ParseCache(self.cache_dir)
+        self.filename = os.path.join(self.directory, 'source.scm')
+        self.write_source(SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_source(self, source):
+        with open(self.filename, 'w') as f:
+            f.write(source)
+
+    def entries(self):
+        return os.listdir(self.cache_dir)
+
+    def test_load_parses_file(self):
+        self.assertEqual(Parser.from_string(SOURCE),
+                         self.cache.load(self.filename))
+        self.assertEqual(1, len(self.entries()))
+
+    def test_load_unchanged_file_skips_parsing(self):
+        self.cache.load(self.filename)
+        from_buffer = Parser.from_buffer
+        Parser.from_buffer = None
+        try:
+            result = self.cache.load(self.filename)
+        finally:
+            Parser.from_buffer = from_buffer
+        self.assertEqual(Parser.from_string(SOURCE), result)
+
+    def test_load_changed_file(self):
+        self.cache.load(self.filename)
+        self.write_source('(other)')
+        self.assertEqual(Parser.from_string('(other)'),
+                         self.cache.load(self.filename))
+        self.assertEqual(2, len(self.entries()))
+
+    def test_load_without_writable_directory(self):
+        cache = ParseCache(os.path.join(self.filename, 'cache'))
+        self.assertEqual(Parser.from_string(SOURCE),
+                         cache.load(self.filename))
+
+    def test_load_ignores_corrupt_entry(self):
+        self.cache.load(self.filename)
+        entry, = self.entries()
+        with open(os.path.join(self.cache_dir, entry), 'wb') as f:
+            f.write(ParseCache.MAGIC + 'garbage')
+        self.assertEqual(Parser.from_string(SOURCE),
+                         self.cache.load(self.filename))
+
+    def test_load_ignores_other_format(self):
+        self.cache.load(self.filename)
+        entry, = self.entries()
+        with open(os.path.join(self.cache_dir, entry), 'wb') as f:
+            f.write('pysc-parse-cache-0\n')
+        self.assertEqual(Parser.from_string(SOURCE),
+                         self.cache.load(self.filename))
+
+    def test_load_rational(self):
+        self.write_source('(+ 1/3 1)')
+        self.cache.load(self.filename)
+        expr, = self.cache.load(self.filename)
+        self.assertEqual(Fraction(1, 3), expr.contents[1].contents)
+        self.assertEqual(1, expr.contents[2].contents)
+        self.assertIs(int, type(expr.contents[2].contents))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
 import StringIO
+import operator
+from fractions import Fraction
 from unittest import TestCase, main
+from pysc.output import OutputPort
 from pysc.environment import Environment, Procedure, BuiltinProcedure, \
-    Expression, Builtins, SymbolError
+    MemoizedProcedure, Expression, Builtins, SymbolError, ArityError, \
+    TailCall, execute, Pair, Symbol, NIL, make_list, written
 
 
 # Some aliases to greatly reduce space in tests
@@ -113,6 +117,56 @@ class test_environment(TestCase):
     def test_eval_symbol_not_found_raises_error(self):
         self.assertRaises(SymbolError, self.env.eval, E('foo'))
 
+    def test_analyze_can_be_run_many_times(self):
+        self.set_namespace({ADD: BuiltinProcedure(add), VAL1: 123})
+        code = self.env.analyze(E([ADD_EXPR, VAL1_EXPR, E(1, CT)], C))
+        self.assertEqual(124, code(self.env))
+        self.env.namespace[VAL1] = 1
+        self.assertEqual(2, code(self.env))
+
+    def test_define_analyzes_procedure_body(self):
+        self.env.eval(E([E('define', N), E([PROC_NAME_EXPR, PM1_EXPR], C),
+                         PM1_EXPR], C))
+        self.assertIsNotNone(self.env.namespace[PROC_NAME].code)
+
+    def test_eval_variable_in_parent(self):
+        parent = Environment(namespace={VAL1: NUMERIC_VAL})
+        self.env = Environment(parent=parent)
+        self.assert_eval_results(VAL1_EXPR, NUMERIC_VAL)
+
+    def test_eval_variable_shadows_parent(self):
+        parent = Environment(namespace={VAL1: NUMERIC_VAL})
+        self.env = Environment(namespace={VAL1: INT_VAL}, parent=parent)
+        self.assert_eval_results(VAL1_EXPR, INT_VAL)
+
+    def test_eval_binary_builtin(self):
+        # The binary function differs from the general one, to show
+        # which of them is called.
+        self.set_namespace({ADD: BuiltinProcedure(add, binary=operator.sub)})
+        self.assert_eval_results(E([ADD_EXPR, E(3, CT), E(2, CT)], C), 1)
+        self.assert_eval_results(
+            E([ADD_EXPR, E(3, CT), E(2, CT), E(1, CT)], C), 5)
+
+    def test_eval_binary_builtin_redefined(self):
+        self.set_namespace({ADD: BuiltinProcedure(add, binary=operator.add),
+                            PROC_NAME: Procedure(
+                    [E([ADD_EXPR, PM1_EXPR, PM2_EXPR], C)],
+                    parameters=[PM1, PM2])})
+        call = E([PROC_NAME_EXPR, E(3, CT), E(2, CT)], C)
+        self.assert_eval_results(call, 5)
+        self.env.namespace[ADD] = BuiltinProcedure(lambda x: x[0] * x[1])
+        self.assert_eval_results(call, 6)
+
+    def test_eval_binary_builtin_shadowed_by_parameter(self):
+        self.set_namespace({ADD: BuiltinProcedure(add, binary=operator.add),
+                            PROC_NAME: Procedure(
+                    [E([ADD_EXPR, PM1_EXPR, PM2_EXPR], C)],
+                    parameters=[ADD, PM1, PM2])})
+        self.assert_eval_results(
+            E([PROC_NAME_EXPR,
+               E(BuiltinProcedure(lambda x: x[0] - x[1]), CT),
+               E(3, CT), E(2, CT)], C), 1)
+
 
 class test_expression(TestCase):
     def test_scalar(self):
@@ -207,6 +261,11 @@ class test_expression(TestCase):
         expr = Expression(DEF_NAME, Expression.NAME)
         self.assertEqual('%r' % DEF_NAME, str(expr))
 
+    def test_no_instance_dictionary(self):
+        expr = Expression(INT_VAL, Expression.CONSTANT)
+        with self.assertRaises(AttributeError):
+            expr.attribute = None
+
     def test_str_combination(self):
         expr = Expression([INT_VAL_EXPR], Expression.COMBINATION)
         self.assertEqual('[%s]' % str(INT_VAL_EXPR), str(expr))
@@ -216,8 +275,6 @@ class test_special_forms(TestCase):
 
     def setUp(self):
         self.env = Environment()
-        # Disable tail call elimination
-        self.env._special_form_tail_call = False
         self.set_namespace({})
 
     def set_namespace(self, namespace):
@@ -267,6 +324,29 @@ class test_special_forms(TestCase):
             Procedure([E([PM1_EXPR, PM2_EXPR, PM3_EXPR], C)],
                       parameters=[PM1, PM2, PM3]))
 
+    # quote
+    def test_quote_name(self):
+        result = self.call_special_form(self.env._quote, [VAL1_EXPR])
+        self.assertIsInstance(result, Symbol)
+        self.assertEqual(VAL1, result)
+
+    def test_quote_combination(self):
+        result = self.call_special_form(
+            self.env._quote,
+            [E([VAL1_EXPR, E([INT_VAL_EXPR], C), E('.'), FLOAT_VAL_EXPR], C)])
+        self.assertEqual('(val1 (123) . 3.14)', repr(result))
+
+    def test_quote_empty_combination(self):
+        self.assert_special_form_returns(self.env._quote, [E([], C)], NIL)
+
+    def test_quoted_define_not_internal_define(self):
+        self.call_special_form(self.env._define, [
+            E([PROC_NAME_EXPR], C),
+            E([E('quote', N), E([E('define', N), VAL1_EXPR, E(3, CT)], C)],
+              C),
+            VAL1_EXPR])
+        self.assertEqual(1, self.env.eval(E([PROC_NAME_EXPR], C)))
+
     # cond
     def test_cond_first_predicate_true(self):
         self.assert_special_form_returns(
@@ -300,6 +380,12 @@ class test_special_forms(TestCase):
             [E([FALSE_VALUE_EXPR, VAL1_EXPR], C), E([ELSE_EXPR, VAL2_EXPR], C)],
             2)
 
+    def test_cond_clauses_after_else_ignored(self):
+        self.assert_special_form_returns(
+            self.env._cond,
+            [E([ELSE_EXPR, VAL1_EXPR], C), E([TRUE_VALUE_EXPR, VAL2_EXPR], C)],
+            1)
+
     def test_cond_with_list_of_expressions(self):
         self.assert_special_form_returns(
             self.env._cond,
@@ -396,6 +482,60 @@ class test_builtins(TestCase):
         result = Builtins.divide([12, 3, 2])
         self.assertEqual(2, result)
 
+    def test_divide_integers_exactly(self):
+        result = Builtins.divide([1, 3])
+        self.assertEqual(Fraction(1, 3), result)
+        result = Builtins.divide([Fraction(2, 3), Fraction(1, 3)])
+        self.assertIs(int, type(result))
+        self.assertEqual(2, result)
+
+    def test_whole_rationals_become_integers(self):
+        third = Fraction(1, 3)
+        results = [Builtins.add([third, Fraction(2, 3)]),
+                   Builtins.subtract([Fraction(4, 3), third]),
+                   Builtins.multiply([Fraction(2, 3), 3]),
+                   Builtins.remainder([Fraction(3, 2), Fraction(1, 2)])]
+        namespace = Builtins.namespace()
+        for name, a, b in (('+', third, Fraction(2, 3)),
+                           ('-', Fraction(4, 3), third),
+                           ('*', Fraction(2, 3), 3)):
+            results.append(namespace[name].binary(a, b))
+        self.assertEqual([1, 1, 2, 0, 1, 1, 2], results)
+        for result in results:
+            self.assertIs(int, type(result))
+
+    def test_divide_one_operand(self):
+        self.assertEqual(Fraction(1, 4), Builtins.divide([4]))
+
+    def test_divide_inexact(self):
+        self.assertEqual(0.25, Builtins.divide([1, 4.0]))
+        self.assertEqual(0.25, Builtins.divide([0.5, 2]))
+
+    def test_exact_to_inexact(self):
+        self.assertEqual(0.25, Builtins.exact_to_inexact([Fraction(1, 4)]))
+
+    def test_inexact_to_exact(self):
+        self.assertEqual(Fraction(1, 4), Builtins.inexact_to_exact([0.25]))
+        result = Builtins.inexact_to_exact([2.0])
+        self.assertIs(int, type(result))
+        self.assertEqual(2, result)
+
+    def test_exact(self):
+        self.assertTrue(Builtins.exact([1]))
+        self.assertTrue(Builtins.exact([2 ** 100]))
+        self.assertTrue(Builtins.exact([Fraction(1, 3)]))
+        self.assertFalse(Builtins.exact([1.0]))
+
+    def test_inexact(self):
+        self.assertTrue(Builtins.inexact([1.0]))
+        self.assertFalse(Builtins.inexact([Fraction(1, 3)]))
+
+    def test_numerator_denominator(self):
+        self.assertEqual(3, Builtins.numerator([Fraction(6, 4)]))
+        self.assertEqual(2, Builtins.denominator([Fraction(6, 4)]))
+        self.assertEqual(1, Builtins.denominator([5]))
+        self.assertEqual(4.0, Builtins.denominator([0.25]))
+
     def test_not_true(self):
         result = Builtins.not_([False])
         self.assertTrue(result)
@@ -446,6 +586,45 @@ class test_builtins(TestCase):
         stream.seek(0)
         self.assertEqual(STRING_VAL, stream.read())
 
+    def test_display_to_port(self):
+        stream = StringIO.StringIO()
+        port = StringIO.StringIO()
+        Builtins.display([STRING_VAL, port], stream)
+        self.assertEqual(STRING_VAL, port.getvalue())
+        self.assertEqual('', stream.getvalue())
+
+    def test_newline_to_port(self):
+        port = StringIO.StringIO()
+        Builtins.newline([port], None)
+        self.assertEqual('\n', port.getvalue())
+
+    def test_flush_output(self):
+        stream = StringIO.StringIO()
+        port = OutputPort(stream)
+        port.write('a')
+        Builtins.flush_output([], port)
+        self.assertEqual('a', stream.getvalue())
+
+    def test_with_output_to_string(self):
+        port = OutputPort(StringIO.StringIO())
+        display = BuiltinProcedure(Builtins.display, True, port)
+        thunk = BuiltinProcedure(lambda x: display.apply(None, ['a']) or 1)
+        self.assertEqual('a', Builtins.with_output_to_string([thunk], port))
+
+    def test_current_output_port(self):
+        port = OutputPort(StringIO.StringIO())
+        self.assertIs(port, Builtins.current_output_port([], port))
+
+    def test_namespace_shares_output_port(self):
+        stream = StringIO.StringIO()
+        namespace = Builtins.namespace(stream)
+        port = namespace['display'].stream
+        self.assertIsInstance(port, OutputPort)
+        self.assertIs(port, namespace['newline'].stream)
+        self.assertIs(port, namespace['with-output-to-string'].stream)
+        namespace['display'].apply(None, ['a'])
+        self.assertEqual('a', stream.getvalue())
+
     def test_runtime(self):
         t1 = Builtins.runtime(None)
         t2 = Builtins.runtime(None)
@@ -455,6 +634,81 @@ class test_builtins(TestCase):
         result = Builtins.random([1])
         self.assertEqual(0, result)
 
+    def test_cons_car_cdr(self):
+        pair = Builtins.cons([1, 2])
+        self.assertEqual(1, Builtins.car([pair]))
+        self.assertEqual(2, Builtins.cdr([pair]))
+
+    def test_list(self):
+        self.assertEqual('(1 "a" b)', repr(Builtins.list_([1, 'a',
+                                                            Symbol('b')])))
+        self.assertIs(NIL, Builtins.list_([]))
+
+    def test_null(self):
+        self.assertTrue(Builtins.null([NIL]))
+        self.assertFalse(Builtins.null([make_list([1])]))
+
+    def test_pair(self):
+        self.assertTrue(Builtins.pair([Pair(1, 2)]))
+        self.assertFalse(Builtins.pair([NIL]))
+
+    def test_length(self):
+        self.assertEqual(0, Builtins.length([NIL]))
+        self.assertEqual(100000, Builtins.length([make_list(range(100000))]))
+        self.assertRaises(TypeError, Builtins.length, [Pair(1, 2)])
+
+    def test_append(self):
+        result = Builtins.append([make_list([1, 2]), NIL, make_list([3]), 4])
+        self.assertEqual('(1 2 3 . 4)', repr(result))
+        self.assertIs(NIL, Builtins.append([]))
+
+    def test_append_shares_last_list(self):
+        last = make_list([3])
+        self.assertIs(last, Builtins.append([make_list([1, 2]), last]).cdr.cdr)
+
+    def test_map(self):
+        square = BuiltinProcedure(lambda x: x[0] * x[0])
+        self.assertEqual('(1 4 9)', repr(Builtins.map_(
+            [square, make_list([1, 2, 3])])))
+
+    def test_map_many_lists(self):
+        self.assertEqual('(11 22)', repr(Builtins.map_(
+            [BuiltinProcedure(add), make_list([1, 2, 3]),
+             make_list([10, 20])])))
+
+    def test_map_long_list(self):
+        result = Builtins.map_([BuiltinProcedure(lambda x: -x[0]),
+                                make_list(range(100000))])
+        self.assertEqual(100000, Builtins.length([result]))
+
+    def test_reverse(self):
+        self.assertEqual('(3 2 1)', repr(Builtins.reverse(
+            [make_list([1, 2, 3])])))
+
+
+class test_written(TestCase):
+    def test_numbers(self):
+        self.assertEqual('1/3', written(Fraction(1, 3)))
+        self.assertEqual(str(2 ** 100), written(2 ** 100))
+        self.assertEqual('0.1', written(0.1))
+
+    def test_string(self):
+        self.assertEqual('"a"', written('a'))
+
+
+class test_pair(TestCase):
+    def test_repr(self):
+        self.assertEqual('(1 (2 3) . 4)',
+                         repr(Pair(1, Pair(make_list([2, 3]), 4))))
+
+    def test_repr_long_list(self):
+        values = range(100000)
+        self.assertEqual('(%s)' % ' '.join(map(str, values)),
+                         repr(make_list(values)))
+
+    def test_no_instance_dictionary(self):
+        self.assertFalse(hasattr(Pair(1, 2), '__dict__'))
+
 
 class test_procedure(TestCase):
     def setUp(self):
@@ -524,6 +778,51 @@ class test_procedure(TestCase):
         self.assert_procedure_results([PM1_EXPR, NUMERIC_VAL_EXPR],
                                       [PM1], [42], NUMERIC_VAL)
 
+    def test_apply_uses_defining_environment(self):
+        """Test that free names are looked up where it was defined."""
+
+        definer = Environment(namespace={VAL1: 1})
+        self.set_namespace({VAL1: 2})
+        p = Procedure([VAL1_EXPR], [], env=definer)
+        self.assertEqual(p.apply(self.env, []), 1)
+
+    def test_apply_does_not_change_caller_namespace(self):
+        """Test that parameters and defines stay in the new frame."""
+
+        self.set_namespace({})
+        p = Procedure([E([E('define', N), VAL1_EXPR, PM1_EXPR], C)],
+                      [PM1], env=self.env)
+        p.apply(self.env, [42])
+        self.assertEqual({}, self.env.namespace)
+
+    def test_apply_internal_define_sees_parameters(self):
+        """Test that an internally defined procedure is a closure."""
+
+        self.set_namespace({ADD: BuiltinProcedure(add)})
+        self.assert_procedure_results(
+            [E([E('define', N), E([PROC_NAME_EXPR, PM2_EXPR], C),
+                E([ADD_EXPR, PM1_EXPR, PM2_EXPR], C)], C),
+             E([PROC_NAME_EXPR, E(2, CT)], C)],
+            [PM1], [40], 42)
+
+    def test_apply_unassigned_internal_define_raises_error(self):
+        p = Procedure([VAL1_EXPR, E([E('define', N), VAL1_EXPR, PM1_EXPR], C)],
+                      [PM1])
+        self.assertRaises(SymbolError, p.apply, self.env, [42])
+
+    def test_apply_tail_call_returns_marker(self):
+        """Test that a tail call is returned instead of run."""
+
+        p = Procedure([PM1_EXPR], [PM1])
+        tail_call = p.apply(self.env, [42], eliminate_tail_call=True)
+        self.assertIsInstance(tail_call, TailCall)
+        self.assertEqual(42, execute(tail_call.code, tail_call.frame))
+
+    def test_apply_wrong_number_of_arguments_raises_error(self):
+        p = Procedure([PM1_EXPR], [PM1])
+        self.assertRaises(ArityError, p.apply, self.env, [])
+        self.assertRaises(ArityError, p.apply, self.env, [1, 2])
+
 
 class test_builtin_procedure(TestCase):
 
@@ -593,5 +892,65 @@ class test_builtin_procedure(TestCase):
         self.assertFalse(p5 == p6)
 
 
+class test_memoized_procedure(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.procedure = BuiltinProcedure(self.square)
+
+    def square(self, operands):
+        self.calls.append(operands)
+        return operands[0] * operands[0]
+
+    def test_result_cached(self):
+        p = MemoizedProcedure(self.procedure)
+        self.assertEqual(9, p.apply(None, [3]))
+        self.assertEqual(9, p.apply(None, [3]))
+        self.assertEqual([[3]], self.calls)
+        self.assertEqual((1, 1), (p.hits, p.misses))
+
+    def test_least_recently_used_dropped(self):
+        p = MemoizedProcedure(self.procedure, 2)
+        p.apply(None, [1])
+        p.apply(None, [2])
+        p.apply(None, [1])
+        p.apply(None, [3])
+        self.assertEqual([((int, 1),), ((int, 3),)], p.cache.keys())
+        p.apply(None, [2])
+        self.assertEqual([[1], [2], [3], [2]], self.calls)
+        self.assertEqual((1, 4), (p.hits, p.misses))
+
+    def test_equal_arguments_of_other_types_cached_apart(self):
+        p = MemoizedProcedure(BuiltinProcedure(
+            lambda x: Builtins.divide([x[0], 2])))
+        self.assertEqual(Fraction(1, 2), p.apply(None, [1]))
+        result = p.apply(None, [1.0])
+        self.assertEqual(0.5, result)
+        self.assertIsInstance(result, float)
+        self.assertEqual((0, 2), (p.hits, p.misses))
+        identity = MemoizedProcedure(BuiltinProcedure(lambda x: x[0]))
+        identity.apply(None, [1])
+        self.assertIs(True, identity.apply(None, [True]))
+
+    def test_unhashable_arguments_not_cached(self):
+        p = MemoizedProcedure(BuiltinProcedure(lambda x: len(x[0])))
+        self.assertEqual(2, p.apply(None, [[1, 2]]))
+        self.assertEqual(0, len(p.cache))
+        self.assertEqual(1, p.misses)
+
+    def test_memoize_builtins(self):
+        env = Environment(namespace=Builtins.namespace())
+        env.namespace[PROC_NAME] = self.procedure
+        define = E([E('define', N), PROC_NAME_EXPR,
+                    E([E('memoize', N), PROC_NAME_EXPR, E(10, CT)], C)], C)
+        env.eval(define)
+        for i in range(3):
+            self.assertEqual(4, env.eval(E([PROC_NAME_EXPR, E(2, CT)], C)))
+        self.assertEqual(10, env.namespace[PROC_NAME].size)
+        self.assertEqual(2, env.eval(E([E('memoize-hits', N),
+                                        PROC_NAME_EXPR], C)))
+        self.assertEqual(1, env.eval(E([E('memoize-misses', N),
+                                        PROC_NAME_EXPR], C)))
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import StringIO
+from unittest import TestCase, main
+from pysc.environment import Environment, Builtins, BuiltinProcedure, \
+    NIL, Symbol, make_list
+from pysc.image import ImageError, MAGIC, save, load
+from pysc.tests import EvaluatorMixin, MachineMixin
+
+
+PRELUDE = """
+(define (square x) (* x x))
+(define (make-adder n)
+  (define (add x) (+ x n))
+  add)
+(define add5 (make-adder 5))
+(define plus +)
+(define items (list 1 2/3 "s" 'sym))
+(define (greet) (display "hello"))
+"""
+
+
+class test_image(EvaluatorMixin, TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'image')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def saved_env(self):
+        env = Environment(namespace=Builtins.namespace())
+        self.eval_string(PRELUDE, self.make_evaluator(env))
+        save(env, self.filename)
+        return env
+
+    def loaded_env(self, outstream=None):
+        env = Environment(namespace=Builtins.namespace(outstream))
+        load(env, self.filename)
+        return env
+
+    def test_procedures(self):
+        self.saved_env()
+        evaluator = self.make_evaluator(self.loaded_env())
+        self.assertEqual(16, self.eval_string('(square 4)', evaluator))
+        self.assertEqual(6, self.eval_string('(add5 1)', evaluator))
+
+    def test_builtins_are_those_of_loading_environment(self):
+        self.saved_env()
+        outstream = StringIO.StringIO()
+        env = self.loaded_env(outstream)
+        self.assertIs(env.namespace['+'], env.namespace['plus'])
+        self.eval_string('(greet)', self.make_evaluator(env))
+        self.assertEqual('hello', outstream.getvalue())
+
+    def test_data(self):
+        self.saved_env()
+        env = self.loaded_env()
+        items = env.namespace['items']
+        self.assertEqual('(1 2/3 "s" sym)', repr(items))
+        self.assertIsInstance(items.cdr.cdr.cdr.car, Symbol)
+        self.assertIs(NIL, items.cdr.cdr.cdr.cdr)
+
+    def test_long_list(self):
+        env = Environment(namespace=Builtins.namespace())
+        env.namespace['items'] = make_list(range(100000))
+        save(env, self.filename)
+        items = self.loaded_env().namespace['items']
+        self.assertEqual(100000, Builtins.length([items]))
+
+    def test_unnamed_builtin_throws_error(self):
+        env = Environment(namespace=Builtins.namespace())
+        env.namespace['f'] = BuiltinProcedure(Builtins.add)
+        self.assertRaises(ImageError, save, env, self.filename)
+
+    def test_port_throws_error(self):
+        env = Environment(namespace=Builtins.namespace(StringIO.StringIO()))
+        self.eval_string('(define port (current-output-port))',
+                         self.make_evaluator(env))
+        self.assertRaises(ImageError, save, env, self.filename)
+
+    def test_missing_builtin_throws_error(self):
+        self.saved_env()
+        env = Environment(namespace={})
+        self.assertRaises(ImageError, load, env, self.filename)
+
+    def test_other_version_throws_error(self):
+        self.saved_env()
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        with open(self.filename, 'wb') as f:
+            f.write('pysc-image-0\n' + data[len(MAGIC):])
+        self.assertRaises(ImageError, self.loaded_env)
+
+    def test_truncated_throws_error(self):
+        self.saved_env()
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        with open(self.filename, 'wb') as f:
+            f.write(data[:len(MAGIC) + 10])
+        self.assertRaises(ImageError, self.loaded_env)
+
+
+class test_image_with_machine(MachineMixin, test_image):
+
+    """Run the image tests evaluating with a Machine."""
+
+
+if __name__ == '__main__':
+    main()
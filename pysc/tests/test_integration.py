@@ -1,17 +1,26 @@
 import os
 import StringIO
 from itertools import ifilter, imap
-from pysc.environment import Environment, Builtins, Expression
+from pysc.environment import Environment, Builtins, Expression, written
+from pysc.machine import Machine
+from pysc.optimizer import Optimizer
 from pysc.parser import Parser
 
 
-def run_session(filename):
+def run_session(filename, engine='analyzer', optimize=False):
     """Run session test.
 
+    engine is 'analyzer' to evaluate directly by the Environment, or
+    'machine' to evaluate with a Machine.  If optimize is true, the
+    expressions are passed through an Optimizer first.
+
     Output summary to stdout and return True if all test pass,
     otherwise return False."""
 
     env = Environment(namespace=Builtins.namespace())
+    optimizer = Optimizer(env) if optimize else None
+    if engine == 'machine':
+        env = Machine(env)
     num_tests, num_passed = 0, 0
     with open(filename) as f:
         input_expression = ""
@@ -30,8 +39,10 @@ def run_session(filename):
 
                 parser = Parser(StringIO.StringIO(input_expression))
                 for expr in parser.expressions():
+                    if optimizer is not None:
+                        expr = optimizer.optimize(expr)
                     result = env.eval(expr)
-                    result = repr(result) if result is not None else ''
+                    result = written(result) if result is not None else ''
 
                 expected = line.rstrip('\n')
                 if result != expected:
@@ -47,7 +58,8 @@ def run_session(filename):
                                                  num_tests, num_passed)
     return num_tests == num_passed
 
-def test_all_sessions(assert_success=True):
+def test_all_sessions(assert_success=True, engine='analyzer',
+                      optimize=False):
     """Test all session files.
 
     If assert_success is true, for each run test, assert it's success.
@@ -56,15 +68,25 @@ def test_all_sessions(assert_success=True):
 
     When runnning standalone it should be called with assert_success
     set to False in order to see a summary of the results of all
-    session tests."""
+    session tests.
+
+    engine and optimize are passed on to run_session()."""
 
     sessiondir = os.path.join(os.path.dirname(__file__), 'sessions')
     entries = [os.path.join(sessiondir, x) for x in os.listdir(sessiondir)]
     for filename in ifilter(os.path.isfile, entries):
-        success = run_session(filename)
+        success = run_session(filename, engine, optimize)
         if assert_success:
             assert success
 
+def test_all_sessions_with_machine(assert_success=True):
+    test_all_sessions(assert_success, engine='machine')
+
+def test_all_sessions_optimized(assert_success=True):
+    test_all_sessions(assert_success, optimize=True)
+
 
 if __name__ == '__main__':
     test_all_sessions(assert_success=False)
+    test_all_sessions_with_machine(assert_success=False)
+    test_all_sessions_optimized(assert_success=False)
@@ -0,0 +1,115 @@
+from unittest import TestCase, main
+from pysc.environment import Environment, Builtins
+from pysc.limits import Limits, LimitExceeded, StepLimitExceeded, \
+    TimeLimitExceeded, DepthLimitExceeded
+from pysc.machine import RecursionDepthError
+from pysc.tests import EvaluatorMixin, MachineMixin
+
+
+PROGRAM = """
+(define (loop) (loop))
+(define (count n) (if (= n 0) 0 (count (- n 1))))
+(define (sum n) (if (= n 0) 0 (+ n (sum (- n 1)))))
+"""
+
+
+class test_limits(TestCase):
+    def test_steps(self):
+        limits = Limits(max_steps=10, check_interval=3)
+        for i in range(10):
+            limits.step()
+        self.assertEqual(10, limits.steps)
+        self.assertRaises(StepLimitExceeded, limits.step)
+        self.assertRaises(StepLimitExceeded, limits.step)
+
+    def test_reset(self):
+        limits = Limits(max_steps=2)
+        limits.step()
+        limits.step()
+        limits.reset()
+        self.assertEqual(0, limits.steps)
+        limits.step()
+        self.assertEqual(1, limits.steps)
+
+    def test_deadline_checked_every_interval(self):
+        limits = Limits(timeout=0, check_interval=5)
+        for i in range(4):
+            limits.step()
+        self.assertRaises(TimeLimitExceeded, limits.step)
+
+    def test_remaining(self):
+        limits = Limits(max_steps=10, timeout=60, max_depth=5)
+        limits.depth = 2
+        for i in range(4):
+            limits.step()
+        remaining = limits.remaining()
+        self.assertEqual(6, remaining.max_steps)
+        self.assertEqual(3, remaining.max_depth)
+        self.assertEqual(limits.deadline, remaining.deadline)
+        limits.add_steps(6)
+        self.assertEqual(10, limits.steps)
+        self.assertRaises(StepLimitExceeded, limits.add_steps, 1)
+
+    def test_errors_are_limit_exceeded(self):
+        for error in (StepLimitExceeded, TimeLimitExceeded,
+                      DepthLimitExceeded, RecursionDepthError):
+            self.assertTrue(issubclass(error, LimitExceeded))
+
+
+class test_limited_evaluation(EvaluatorMixin, TestCase):
+    def setUp(self):
+        self.env = Environment(namespace=Builtins.namespace())
+        self.evaluator = self.make_evaluator(self.env)
+
+    def test_unlimited(self):
+        self.eval_string(PROGRAM)
+        self.assertEqual(0, self.eval_string('(count 10)'))
+
+    def test_step_limit_stops_loop(self):
+        limits = Limits(max_steps=1000)
+        self.env.limits = limits
+        self.eval_string(PROGRAM)
+        self.assertEqual(0, self.eval_string('(count 999)'))
+        limits.reset()
+        self.assertRaises(StepLimitExceeded, self.eval_string,
+                          '(count 1000)')
+        limits.reset()
+        self.assertRaises(StepLimitExceeded, self.eval_string, '(loop)')
+
+    def test_limits_apply_to_procedures_defined_before(self):
+        self.eval_string(PROGRAM)
+        self.eval_string('(define (make-loop) (define (inner) (inner)) inner)'
+                         '(define inner-loop (make-loop))'
+                         '(define loops (list inner-loop))')
+        limits = Limits(max_steps=1000)
+        self.env.limits = limits
+        self.assertRaises(StepLimitExceeded, self.eval_string, '(loop)')
+        limits.reset()
+        self.assertRaises(StepLimitExceeded, self.eval_string,
+                          '((car loops))')
+        self.env.limits = None
+        self.assertEqual(0, self.eval_string('(count 2000)'))
+
+    def test_time_limit_stops_loop(self):
+        self.env.limits = Limits(timeout=0.01)
+        self.eval_string(PROGRAM)
+        self.assertRaises(TimeLimitExceeded, self.eval_string, '(loop)')
+
+    def test_depth_limit(self):
+        limits = Limits(max_depth=50)
+        self.env.limits = limits
+        self.eval_string(PROGRAM)
+        self.assertEqual(820, self.eval_string('(sum 40)'))
+        self.assertRaises(DepthLimitExceeded, self.eval_string, '(sum 60)')
+        self.assertEqual(0, self.eval_string('(count 100)'))
+        self.assertEqual(0, limits.depth)
+
+
+class test_limited_evaluation_with_machine(MachineMixin,
+                                          test_limited_evaluation):
+
+    """Run the limited evaluation tests with a Machine."""
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import sys
+from unittest import TestCase, main
+from pysc.environment import Environment, Procedure, Builtins, \
+    Expression, SymbolError, ArityError
+from pysc.machine import Machine, RecursionDepthError, disassemble
+from pysc.parser import Parser
+from pysc.tests import MachineMixin, test_environment
+
+
+SUM = """
+(define (sum n)
+  (if (= n 0)
+      0
+      (+ n (sum (- n 1)))))
+"""
+
+
+class test_machine(MachineMixin, TestCase):
+    def setUp(self):
+        self.env = Environment(namespace=Builtins.namespace())
+        self.machine = self.evaluator = self.make_evaluator(self.env)
+
+    def assert_eval_results(self, inp, outp):
+        self.assertEqual(outp, self.eval_string(inp))
+
+    def test_constant(self):
+        self.assert_eval_results('42', 42)
+
+    def test_define_global(self):
+        self.assert_eval_results('(define x 42)', 'x')
+        self.assertEqual(42, self.env.namespace['x'])
+
+    def test_if_without_alternative(self):
+        self.assert_eval_results('(if false 1)', None)
+
+    def test_cond_else(self):
+        self.assert_eval_results('(cond (false 1) ((= 1 2) 2) (else 3))', 3)
+
+    def test_cond_no_predicate_true(self):
+        self.assert_eval_results('(cond (false 1))', None)
+
+    def test_and(self):
+        self.assert_eval_results('(and 1 2)', 2)
+        self.assert_eval_results('(and 1 0 2)', False)
+        self.assert_eval_results('(and 1 0)', False)
+
+    def test_or(self):
+        self.assert_eval_results('(or 0 2 3)', 2)
+        self.assert_eval_results('(or 0 0)', False)
+
+    def test_internal_define_closure(self):
+        self.eval_string('(define (f x) (define (g y) (+ x y)) (g 2))')
+        self.assert_eval_results('(f 40)', 42)
+
+    def test_unassigned_internal_define_raises_error(self):
+        self.eval_string('(define (f) y (define y 1))')
+        self.assertRaises(SymbolError, self.eval_string, '(f)')
+
+    def test_wrong_number_of_arguments_raises_error(self):
+        self.eval_string('(define (f x) x)')
+        self.assertRaises(ArityError, self.eval_string, '(f 1 2)')
+
+    def test_deep_recursion(self):
+        """Test recursion much deeper than the Python stack allows."""
+
+        self.eval_string(SUM)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100)
+        try:
+            self.assert_eval_results('(sum 20000)', 200010000)
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def test_deep_memoized_recursion(self):
+        self.eval_string(SUM)
+        self.eval_string('(define sum (memoize sum))')
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100)
+        try:
+            self.assert_eval_results('(sum 5000)', 12502500)
+        finally:
+            sys.setrecursionlimit(limit)
+        sum_ = self.env.namespace['sum']
+        self.assertEqual((0, 5001), (sum_.hits, sum_.misses))
+        self.assert_eval_results('(sum 5001)', 12507501)
+        self.assertEqual((1, 5002), (sum_.hits, sum_.misses))
+
+    def test_memoized_tail_call(self):
+        self.eval_string('(define (loop n) (if (= n 0) 0 (loop (- n 1))))')
+        self.eval_string('(define loop (memoize loop))')
+        self.eval_string('(define (f n) (loop n))')
+        self.assert_eval_results('(f 3)', 0)
+        self.assertEqual(4, len(self.env.namespace['loop'].cache))
+
+    def test_max_depth(self):
+        self.machine.max_depth = 100
+        self.eval_string(SUM)
+        self.assert_eval_results('(sum 100)', 5050)
+        self.assertRaises(RecursionDepthError, self.eval_string, '(sum 101)')
+
+    def test_tail_calls_not_limited_by_max_depth(self):
+        self.machine.max_depth = 10
+        self.eval_string('(define (loop n) (if (= n 0) 0 (loop (- n 1))))')
+        self.assert_eval_results('(loop 1000)', 0)
+
+    def test_procedure_applied_outside_machine(self):
+        self.eval_string('(define (f x) (define y 2) (* x y))')
+        self.assertEqual(42, self.env.namespace['f'].apply(self.env, [21]))
+
+    def test_procedure_created_outside_machine(self):
+        self.env.namespace['f'] = Procedure(
+            Parser.from_string('(+ x 1)'), ['x'])
+        self.assert_eval_results('(f 41)', 42)
+
+    def test_binary_call_redefined_as_procedure(self):
+        self.eval_string('(define (f x) (+ x 1))')
+        self.assert_eval_results('(f 41)', 42)
+        self.eval_string('(define (+ x y) (* x y))')
+        self.assert_eval_results('(f 41)', 41)
+
+    def test_disassemble(self):
+        expr, = Parser.from_string('(define (f x) (if (< x 1) 0 (f 0)))')
+        listing = disassemble(self.machine.compile(expr))
+        self.assertEqual("""\
+code at top level
+     0 MAKE_PROCEDURE       0 ('f')
+     2 DEFINE_GLOBAL        1 ('f')
+     4 RETURN               0
+
+code of f (x)
+     0 LOAD_LOCAL           0 (x)
+     2 CONST                0 (1)
+     4 BINARY_CALL          1 ('<')
+     6 JUMP_IF_FALSE        12
+     8 CONST                2 (0)
+    10 RETURN               0
+    12 LOAD_GLOBAL          3 ('f')
+    14 CONST                4 (0)
+    16 TAIL_CALL            1
+    18 RETURN               0""", listing)
+
+
+class test_environment_with_machine(test_environment.test_environment):
+
+    """Run the evaluation tests of Environment with a Machine."""
+
+    def assert_eval_results(self, inp, outp):
+        result = Machine(self.env).eval(inp)
+        self.assertEqual(outp, result)
+
+    def test_eval_symbol_not_found_raises_error(self):
+        self.assertRaises(SymbolError, Machine(self.env).eval, Expression('foo'))
+
+
+class test_special_forms_with_machine(test_environment.test_special_forms):
+
+    """Run the special form tests of Environment with a Machine."""
+
+    def call_special_form(self, special_form, inp):
+        name = special_form.__name__.lstrip('_')
+        expr = Expression([Expression(name)] + inp, Expression.COMBINATION)
+        return Machine(self.env).eval(expr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+from unittest import TestCase, main
+from pysc.environment import Environment, Builtins, Expression
+from pysc.optimizer import Optimizer, unparse
+from pysc.parser import Parser
+
+
+class test_optimizer(TestCase):
+    def setUp(self):
+        self.env = Environment(namespace=Builtins.namespace())
+        self.optimizer = Optimizer(self.env)
+
+    def optimize(self, string):
+        exprs = self.optimizer.optimize_all(Parser.from_string(string))
+        return ' '.join(unparse(expr) for expr in exprs)
+
+    def assert_optimizes_to(self, inp, outp):
+        self.assertEqual(outp, self.optimize(inp))
+
+    def test_fold_builtin(self):
+        self.assert_optimizes_to('(* 2 3.5)', '7.0')
+
+    def test_fold_nested(self):
+        self.assert_optimizes_to('(/ 1 (* 4 1000.0))', '0.00025')
+
+    def test_fold_in_procedure_body(self):
+        self.assert_optimizes_to('(define (f r) (* (* 2 3) r))',
+                                 '(define (f r) (* 6 r))')
+
+    def test_fold_comparison(self):
+        self.assert_optimizes_to('(not (< 1 2))', 'false')
+
+    def test_variables_not_folded(self):
+        self.assert_optimizes_to('(define x 1) (+ x 1)',
+                                 '(define x 1) (+ x 1)')
+
+    def test_impure_builtin_not_folded(self):
+        self.assert_optimizes_to('(random 10)', '(random 10)')
+
+    def test_error_not_folded(self):
+        self.assert_optimizes_to('(/ 1 0)', '(/ 1 0)')
+
+    def test_builtin_shadowed_by_parameter_not_folded(self):
+        self.assert_optimizes_to('(define (f +) (+ 1 2))',
+                                 '(define (f +) (+ 1 2))')
+
+    def test_builtin_shadowed_by_internal_define_not_folded(self):
+        self.assert_optimizes_to(
+            '(define (f) (define (* x y) x) (* 1 2))',
+            '(define (f) (define (* x y) x) (* 1 2))')
+
+    def test_builtin_redefined_later_not_folded(self):
+        self.assert_optimizes_to(
+            '(define (f) (+ 1 2)) (define (+ x y) x)',
+            '(define (f) (+ 1 2)) (define (+ x y) x)')
+
+    def test_builtin_redefined_in_earlier_expression_not_folded(self):
+        self.optimizer.optimize(Parser.from_string('(define + 1)')[0])
+        expr, = Parser.from_string('(+ 1 2)')
+        self.assertIs(expr, self.optimizer.optimize(expr))
+
+    def test_one_expression_folded_outside_bodies(self):
+        expr, = Parser.from_string('(define x (+ 1 2))')
+        self.assertEqual('(define x 3)',
+                         unparse(self.optimizer.optimize(expr)))
+        expr, = Parser.from_string('(define (f) (+ 1 2))')
+        self.assertIs(expr, self.optimizer.optimize(expr))
+
+    def test_unchanged_expression_is_same_object(self):
+        expr, = Parser.from_string('(define (f x) (g (h x) 1))')
+        self.assertIs(expr, self.optimizer.optimize(expr))
+
+    def test_if_constant_predicate(self):
+        self.assert_optimizes_to('(if (< 1 2) x y)', 'x')
+        self.assert_optimizes_to('(if (> 1 2) x y)', 'y')
+        self.assert_optimizes_to('(if (> 1 2) x)', '(cond)')
+
+    def test_if_variable_predicate(self):
+        self.assert_optimizes_to('(if x (+ 1 2) y)', '(if x 3 y)')
+
+    def test_cond_constant_predicates(self):
+        self.assert_optimizes_to(
+            '(cond ((> 1 2) a) (x b) ((= 1 1) c d) (else e))',
+            '(cond (x b) (else c d))')
+
+    def test_cond_first_predicate_true(self):
+        self.assert_optimizes_to('(cond ((= 1 1) a) (x b))', 'a')
+
+    def test_cond_no_predicate_true(self):
+        self.assert_optimizes_to('(cond ((= 1 2) a))', '(cond)')
+
+    def test_and(self):
+        self.assert_optimizes_to('(and 1 x 2)', '(and x 2)')
+        self.assert_optimizes_to('(and x 0 y)', '(and x 0)')
+        self.assert_optimizes_to('(and 1 2)', '2')
+        self.assert_optimizes_to('(and 1 0 x)', 'false')
+
+    def test_or(self):
+        self.assert_optimizes_to('(or 0 x 0)', '(or x 0)')
+        self.assert_optimizes_to('(or x 2 y)', '(or x 2)')
+        self.assert_optimizes_to('(or 0 0)', 'false')
+        self.assert_optimizes_to('(or 0 3 x)', '3')
+
+    def test_if_not_special_form_not_simplified(self):
+        self.env.special_forms = {}
+        self.assert_optimizes_to('(if 1 2 3)', '(if 1 2 3)')
+
+    def test_other_special_forms_left_unchanged(self):
+        self.env.special_forms['quote'] = lambda operands: operands[0]
+        self.assert_optimizes_to('(quote (+ 1 2))', '(quote (+ 1 2))')
+
+    def test_optimized_procedure_gives_same_value(self):
+        exprs = Parser.from_string(
+            '(define (f x) (cond ((and 1 (< 1 2)) (* x (- 5 3))) (else 0)))'
+            '(f 21)')
+        for expr in self.optimizer.optimize_all(exprs):
+            result = self.env.eval(expr)
+        self.assertEqual(42, result)
+
+
+class test_unparse(TestCase):
+    def test_constants(self):
+        for value, source in [(1, '1'), (0.5, '0.5'), ('s', '"s"'),
+                              (True, 'true'), (False, 'false')]:
+            self.assertEqual(source,
+                             unparse(Expression(value, Expression.CONSTANT)))
+
+    def test_round_trip(self):
+        source = '(define (f x) (g "a b" 1.5 (h x)))'
+        self.assertEqual(source, unparse(Parser.from_string(source)[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import StringIO
+from unittest import TestCase, main
+from pysc.output import OutputPort, StringPort
+
+
+class CountingStream(object):
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+
+class test_output_port(TestCase):
+    def setUp(self):
+        self.stream = CountingStream()
+
+    def test_collects_writes(self):
+        writer = OutputPort(self.stream, buffer_size=10)
+        writer.write('abc')
+        writer.write('\n')
+        self.assertEqual([], self.stream.writes)
+        writer.write('defghi')
+        self.assertEqual(['abc\ndefghi'], self.stream.writes)
+
+    def test_flush(self):
+        writer = OutputPort(self.stream)
+        writer.write('a')
+        writer.write('b')
+        writer.flush()
+        writer.flush()
+        self.assertEqual(['ab'], self.stream.writes)
+
+    def test_line_buffered(self):
+        writer = OutputPort(self.stream, line_buffered=True)
+        writer.write('a')
+        self.assertEqual([], self.stream.writes)
+        writer.write('b\n')
+        self.assertEqual(['ab\n'], self.stream.writes)
+
+    def test_flushes_stream(self):
+        stream = StringIO.StringIO()
+        writer = OutputPort(stream)
+        writer.write('a')
+        writer.flush()
+        self.assertEqual('a', stream.getvalue())
+
+    def test_isatty(self):
+        self.assertFalse(OutputPort(self.stream).isatty())
+
+    def test_line_buffered_if_interactive(self):
+        self.stream.isatty = lambda: True
+        self.assertTrue(OutputPort(self.stream).line_buffered)
+        del self.stream.isatty
+        self.assertFalse(OutputPort(self.stream).line_buffered)
+
+    def test_unbuffered(self):
+        writer = OutputPort(self.stream, buffer_size=0)
+        writer.write('a')
+        writer.write('b')
+        self.assertEqual(['a', 'b'], self.stream.writes)
+
+    def test_with_output_to(self):
+        writer = OutputPort(self.stream)
+        string_port = StringPort()
+        writer.write('a')
+        result = writer.with_output_to(
+            string_port, lambda: writer.current().write('b') or 42)
+        writer.write('c')
+        writer.flush()
+        self.assertEqual(42, result)
+        self.assertEqual('b', string_port.getvalue())
+        self.assertEqual(['ac'], self.stream.writes)
+        self.assertIs(writer, writer.current())
+
+    def test_with_output_to_nested(self):
+        writer = OutputPort(self.stream)
+        outer, inner = StringPort(), StringPort()
+
+        def write_outer():
+            writer.write('a')
+            writer.with_output_to(inner, lambda: writer.write('b'))
+            writer.write('c')
+        writer.with_output_to(outer, write_outer)
+        self.assertEqual('ac', outer.getvalue())
+        self.assertEqual('b', inner.getvalue())
+
+    def test_with_output_to_restores_on_error(self):
+        writer = OutputPort(self.stream)
+
+        def fail():
+            raise ValueError
+        self.assertRaises(ValueError, writer.with_output_to, StringPort(),
+                          fail)
+        self.assertIs(writer, writer.current())
+
+
+class test_string_port(TestCase):
+    def test_getvalue(self):
+        port = StringPort()
+        port.write('a')
+        port.write('bc')
+        port.flush()
+        self.assertEqual('abc', port.getvalue())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import StringIO
+from unittest import TestCase, main
+from pysc.environment import Environment, Builtins, Procedure, Pair
+from pysc.limits import Limits, StepLimitExceeded
+from pysc.parallel import ParallelBuiltins
+from pysc.tests import EvaluatorMixin, MachineMixin
+
+
+PRELUDE = """
+(define (iota n)
+  (define (loop i acc)
+    (if (= i 0)
+        acc
+        (loop (- i 1) (cons (- i 1) acc))))
+  (loop n nil))
+(define (square x) (* x x))
+(define (make-adder n)
+  (define (add x) (+ x n))
+  add)
+(define (show x) (display x) (newline))
+(define (spin n) (if (= n 0) 0 (spin (- n 1))))
+(define items (iota 20))
+"""
+
+
+class test_parallel(EvaluatorMixin, TestCase):
+    def setUp(self):
+        self.saved = (ParallelBuiltins.jobs, ParallelBuiltins.min_items)
+        ParallelBuiltins.jobs = 2
+        ParallelBuiltins.min_items = 4
+        self.outstream = StringIO.StringIO()
+        self.env = Environment(namespace=Builtins.namespace(self.outstream))
+        self.evaluator = self.make_evaluator(self.env)
+        self.eval_string(PRELUDE)
+
+    def tearDown(self):
+        ParallelBuiltins.jobs, ParallelBuiltins.min_items = self.saved
+
+    def test_pmap(self):
+        result = self.eval_string('(pmap square items)')
+        self.assertEqual(repr(Builtins.map_([self.env.namespace['square'],
+                                             self.env.namespace['items']])),
+                         repr(result))
+
+    def test_several_lists(self):
+        result = self.eval_string('(pmap + items (cdr items))')
+        self.assertEqual(19, Builtins.length([result]))
+        self.assertEqual(37, Builtins.car([Builtins.reverse([result])]))
+
+    def test_builtin(self):
+        self.assertEqual('(0 1 4 9)', repr(self.eval_string(
+            '(pmap * (list 0 1 2 3) (list 0 1 2 3))')))
+
+    def test_procedures_are_returned(self):
+        self.eval_string('(define adders (pmap make-adder items))')
+        adder = self.eval_string('(car (cdr adders))')
+        self.assertIsInstance(adder, Procedure)
+        self.assertIs(self.env, adder.env)
+        self.assertEqual(6, self.eval_string('((car (cdr adders)) 5)'))
+
+    def test_output_is_in_order(self):
+        self.assertIsNone(self.eval_string('(pfor-each show items)'))
+        self.assertEqual(''.join('%d\n' % i for i in range(20)),
+                         self.outstream.getvalue())
+
+    def test_output_can_be_captured(self):
+        self.eval_string('(define (thunk) (pfor-each display items))')
+        self.assertEqual(''.join(map(str, range(20))),
+                         self.eval_string('(with-output-to-string thunk)'))
+        self.assertEqual('', self.outstream.getvalue())
+
+    def test_random_differs_between_workers(self):
+        self.eval_string('(define (draw n) (random 1000000000))')
+        result = self.eval_string('(pmap draw items)')
+        values = []
+        while isinstance(result, Pair):
+            values.append(result.car)
+            result = result.cdr
+        self.assertEqual(20, len(set(values)))
+
+    def test_short_list_is_mapped_here(self):
+        # Ports only exist in this process
+        self.eval_string('(define (port x) (current-output-port))')
+        ParallelBuiltins.min_items = 100
+        result = self.eval_string('(pmap port items)')
+        self.assertIs(self.env.namespace['display'].stream, result.car)
+
+    def test_unstorable_binding_is_left_out(self):
+        self.eval_string('(define port (current-output-port))')
+        self.eval_string('(define msquare (memoize square))')
+        self.eval_string('(pmap msquare items)')
+        # Applied in the workers, with caches of their own
+        self.assertEqual(0, self.eval_string('(memoize-misses msquare)'))
+
+    def test_procedure_needing_unstorable_binding_is_mapped_here(self):
+        self.eval_string('(define port (current-output-port))')
+        self.eval_string('(define (show-here x) (display x port))')
+        self.eval_string('(pfor-each show-here items)')
+        self.assertEqual(''.join(map(str, range(20))),
+                         self.outstream.getvalue())
+
+    def test_changed_bindings_are_sent_again(self):
+        self.eval_string('(define (scale x) (* x 2))')
+        self.assertEqual(38, self.eval_string(
+            '(car (reverse (pmap scale items)))'))
+        self.eval_string('(define (scale x) (* x 3))')
+        self.assertEqual(57, self.eval_string(
+            '(car (reverse (pmap scale items)))'))
+
+    def test_error_is_raised(self):
+        self.assertRaises(ZeroDivisionError, self.eval_string,
+                          '(pmap remainder items items)')
+
+    def test_limits_apply_in_workers(self):
+        self.env.limits = Limits(max_steps=1000)
+        self.eval_string('(define (run n) (spin 10000))')
+        self.assertRaises(StepLimitExceeded, self.eval_string,
+                          '(pmap run items)')
+
+    def test_steps_in_workers_are_counted(self):
+        limits = Limits(max_steps=5000)
+        self.env.limits = limits
+        self.eval_string('(pmap spin items)')
+        # spin takes n + 1 steps
+        self.assertLessEqual(210, limits.steps)
+        self.eval_string('(define (run n) (spin 200))')
+        # Each worker stays within the limit, but not all of them
+        limits.max_steps = 3000
+        limits.reset()
+        self.assertRaises(StepLimitExceeded, self.eval_string,
+                          '(pmap run items)')
+
+
+class test_parallel_with_machine(MachineMixin, test_parallel):
+
+    """Run the parallel tests evaluating with a Machine."""
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
+import os
+import tempfile
+import threading
 import StringIO
+from fractions import Fraction
 from unittest import TestCase, main
 from pysc.parser import Parser, ParseError
 from pysc.environment import Expression as E
@@ -44,6 +48,19 @@ class test_parser(TestCase):
     def test_expressions_float(self):
         self.assert_expressions_results('3.14', E(3.14, E.CONSTANT))
 
+    def test_expressions_rational(self):
+        self.assert_expressions_results('-2/6', E(Fraction(-1, 3),
+                                                  E.CONSTANT))
+
+    def test_expressions_rational_integer(self):
+        result = self.list_expressions('4/2')[0].contents
+        self.assertIs(int, type(result))
+        self.assertEqual(2, result)
+
+    def test_expressions_not_rational(self):
+        self.assert_expressions_results_all(
+            '/ 1/0 a/2', [E('/'), E('1/0'), E('a/2')])
+
     def test_expressions_string(self):
         self.assert_expressions_results('"a b c"', E("a b c", E.CONSTANT))
 
@@ -64,6 +81,18 @@ class test_parser(TestCase):
                   E(0, E.CONSTANT)], E.COMBINATION)],
               E.COMBINATION))
 
+    def test_expressions_quote(self):
+        self.assert_expressions_results_all(
+            "'a '(1 b)'c",
+            [E([E('quote'), E('a')], E.COMBINATION),
+             E([E('quote'),
+                E([E(1, E.CONSTANT), E('b')], E.COMBINATION)],
+               E.COMBINATION),
+             E([E('quote'), E('c')], E.COMBINATION)])
+
+    def test_expressions_quote_at_end_throws_error(self):
+        self.assert_expressions_throws("'", ParseError)
+
     def test_expressions_complex(self):
         self.assert_expressions_results(
             '(a-b - + a+b .( a  b c)(.9 o/ /))',
@@ -107,10 +136,88 @@ class test_parser(TestCase):
         outstream.seek(0)
         self.assertEqual('. ', outstream.read())
 
+    def test_expressions_share_atoms(self):
+        a1, b1, a2, b2 = self.list_expressions('a "b" a "b"')
+        self.assertIs(a1, a2)
+        self.assertIs(b1, b2)
+
+    def test_expressions_do_not_share_equal_constants(self):
+        one, one_float = self.list_expressions('1 1.0')
+        self.assertIsInstance(one.scalar, int)
+        self.assertIsInstance(one_float.scalar, float)
+
+    def test_expressions_atoms_bounded(self):
+        stream = StringIO.StringIO(' '.join(str(i) for i in range(30)))
+        parser = Parser(stream)
+        parser.max_atoms = 10
+        exprs = []
+        for expr in parser.expressions():
+            exprs.append(expr)
+            self.assertLessEqual(len(parser.atoms), 11)
+        self.assertEqual(range(30), [x.contents for x in exprs])
+
+    def test_next_token_newline(self):
+        self.p = Parser(StringIO.StringIO(' a ;comment\n(b)'))
+        tokens = [self.p.next_token() for _ in range(6)]
+        self.assertEqual(['a', '\n', '(', 'b', ')', None], tokens)
+
+    def test_expressions_tokens_across_chunks(self):
+        inp = '(define (f x) ; comment\n  (g "a string" 3.14 x))\n"s" sym'
+        expected = Parser.from_string(inp)
+        for chunk_size in range(1, 8):
+            self.p = Parser(StringIO.StringIO(inp))
+            self.p.chunk_size = chunk_size
+            self.assertEqual(expected, list(self.p.expressions()))
+
+    def test_expressions_from_pipe_before_it_is_closed(self):
+        read_fd, write_fd = os.pipe()
+        stream = os.fdopen(read_fd, 'r')
+        try:
+            os.write(write_fd, '(a)\n')
+            exprs = Parser(stream).expressions()
+            results = []
+            reader = threading.Thread(target=lambda: results.append(
+                next(exprs)))
+            reader.daemon = True
+            reader.start()
+            reader.join(5)
+            self.assertEqual(Parser.from_string('(a)'), results)
+        finally:
+            os.close(write_fd)
+            stream.close()
+
+    def test_expressions_unterminated_string_throws_error(self):
+        self.assert_expressions_throws('"abc', ParseError)
+
     def test_from_string(self):
         result = Parser.from_string('a 1')
         self.assertEqual([E('a', E.NAME), E(1, E.CONSTANT)], result)
 
+    def test_from_buffer(self):
+        inp = '(define (f x) ; comment\n  (g "a string"\n 3.14 x))\n sym'
+        result = list(Parser.from_buffer(inp).expressions())
+        self.assertEqual(Parser.from_string(inp), result)
+
+    def test_from_buffer_unterminated_string_throws_error(self):
+        parser = Parser.from_buffer('(a "b)')
+        self.assertRaises(ParseError, list, parser.expressions())
+
+    def load_file(self, contents):
+        fd, filename = tempfile.mkstemp(suffix='.scm')
+        try:
+            os.write(fd, contents)
+            os.close(fd)
+            return list(Parser.from_file(filename))
+        finally:
+            os.remove(filename)
+
+    def test_from_file(self):
+        inp = '(a "b c")\n;comment\n(d\n 1)'
+        self.assertEqual(Parser.from_string(inp), self.load_file(inp))
+
+    def test_from_file_empty(self):
+        self.assertEqual([], self.load_file(''))
+
 
 if __name__ == '__main__':
     main()
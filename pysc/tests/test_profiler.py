@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import signal
+import shutil
+import tempfile
+import StringIO
+from unittest import TestCase, main
+from pysc.environment import Environment, Builtins, BuiltinProcedure, \
+    SymbolError
+from pysc.profiler import Profiler, SamplingProfiler
+from pysc.tests import EvaluatorMixin, MachineMixin
+
+
+PROGRAM = """
+(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+(define (loop i) (if (= i 0) 0 (loop (- i 1))))
+(define (fail) (+ 1 (undefined)))
+"""
+
+
+class Clock(object):
+
+    """Timer advancing by one second every time it is read."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class test_profiler(TestCase):
+    def setUp(self):
+        self.profiler = Profiler(Clock())
+
+    def test_exclusive_time_excludes_callees(self):
+        self.profiler.enter('f')      # 1
+        self.profiler.enter('g')      # 2
+        self.profiler.exit()          # 3
+        self.profiler.exit()          # 4
+        f = self.profiler.stats['f']
+        g = self.profiler.stats['g']
+        self.assertEqual((3, 2), (f.inclusive, f.exclusive))
+        self.assertEqual((1, 1), (g.inclusive, g.exclusive))
+
+    def test_recursion_counted_once_in_inclusive_time(self):
+        self.profiler.enter('f')      # 1
+        self.profiler.enter('f')      # 2
+        self.profiler.exit()          # 3
+        self.profiler.exit()          # 4
+        f = self.profiler.stats['f']
+        self.assertEqual((2, 3, 3, 2),
+                         (f.calls, f.inclusive, f.exclusive, f.max_depth))
+
+    def test_unwind(self):
+        self.profiler.enter('f')
+        self.profiler.enter('g')
+        self.profiler.enter('h')
+        self.profiler.unwind(1)
+        self.assertEqual(1, len(self.profiler.stack))
+        self.assertEqual(0, self.profiler.stats['g'].depth)
+
+    def test_report(self):
+        self.profiler.enter('f')
+        self.profiler.exit()
+        stream = StringIO.StringIO()
+        self.profiler.report(stream)
+        self.assertEqual(
+            '    calls   inclusive   exclusive     depth  name\n'
+            '        1    1.000000    1.000000         1  f\n',
+            stream.getvalue())
+
+    def test_write(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'profile.json')
+            self.profiler.enter('f')
+            self.profiler.exit()
+            self.profiler.write(filename)
+            with open(filename) as f:
+                results = json.load(f)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([{'name': 'f', 'calls': 1, 'inclusive': 1.0,
+                           'exclusive': 1.0, 'max_depth': 1}], results)
+
+
+class test_profiled_evaluation(EvaluatorMixin, TestCase):
+    def setUp(self):
+        self.profiler = Profiler()
+        self.env = Environment(namespace=Builtins.namespace())
+        self.profiler.instrument(self.env.namespace)
+        self.env.profiler = self.profiler
+        self.evaluator = self.make_evaluator(self.env)
+
+    def stats(self, name):
+        stats = self.profiler.stats[name]
+        return stats.calls, stats.max_depth
+
+    def test_procedures_and_builtins_counted(self):
+        self.eval_string(PROGRAM)
+        self.assertEqual(55, self.eval_string('(fib 10)'))
+        self.assertEqual((177, 10), self.stats('fib'))
+        self.assertEqual((177, 1), self.stats('<'))
+        self.assertEqual((88, 1), self.stats('+'))
+        self.assertEqual([], self.profiler.stack)
+
+    def test_tail_calls_do_not_nest(self):
+        self.eval_string(PROGRAM)
+        self.eval_string('(loop 100)')
+        self.assertEqual((101, 1), self.stats('loop'))
+
+    def test_error_ends_applications(self):
+        self.eval_string(PROGRAM)
+        self.assertRaises(SymbolError, self.eval_string, '(fail)')
+        self.assertEqual([], self.profiler.stack)
+        self.assertEqual(0, self.profiler.stats['fail'].depth)
+
+
+class test_profiled_evaluation_with_machine(MachineMixin,
+                                           test_profiled_evaluation):
+
+    """Run the profiled evaluation tests with a Machine."""
+
+
+class test_sampling_profiler(EvaluatorMixin, TestCase):
+    def setUp(self):
+        self.profiler = SamplingProfiler()
+        self.env = Environment(namespace=Builtins.namespace())
+        self.env.namespace['sample'] = BuiltinProcedure(
+            lambda operands: self.profiler.sample() or 0)
+        self.env.profiler = self.profiler
+        self.evaluator = self.make_evaluator(self.env)
+
+    def test_sample_records_stack(self):
+        self.eval_string('(define (f) (+ (g) 1)) (define (g) (sample) 1) '
+                         '(f) (f) (g)')
+        self.assertEqual(['<top level>;f;g 2', '<top level>;g 1'],
+                         self.profiler.collapsed())
+        self.assertEqual([], self.profiler.stack)
+
+    def test_tail_calls_replace_frame(self):
+        self.eval_string('(define (loop i) (if (= i 0) (sample) '
+                         '(loop (- i 1)))) (define (f) (+ (loop 100) 1)) (f)')
+        self.assertEqual(['<top level>;f;loop 1'], self.profiler.collapsed())
+
+    def test_error_ends_applications(self):
+        self.eval_string(PROGRAM)
+        self.assertRaises(SymbolError, self.eval_string, '(fail)')
+        self.assertEqual([], self.profiler.stack)
+
+    def test_timer(self):
+        self.eval_string(PROGRAM)
+        self.profiler.start()
+        try:
+            start = time.clock()
+            while time.clock() - start < 0.1:
+                self.eval_string('(fib 10)')
+        finally:
+            self.profiler.stop()
+        self.assertGreater(sum(self.profiler.samples.itervalues()), 0)
+        self.assertEqual(signal.SIG_DFL, signal.getsignal(signal.SIGPROF))
+
+    def test_write(self):
+        self.profiler.samples[('f', 'g')] = 3
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'samples.txt')
+            self.profiler.write(filename)
+            with open(filename) as f:
+                self.assertEqual('<top level>;f;g 3\n', f.read())
+        finally:
+            shutil.rmtree(directory)
+
+
+class test_sampling_profiler_with_machine(MachineMixin,
+                                          test_sampling_profiler):
+
+    """Run the sampling profiler tests with a Machine."""
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import StringIO
+from unittest import TestCase, main
+from pysc.limits import Limits
+from pysc.pysc import Interpreter, run_parallel
+
+
+class test_interpreter(TestCase):
+    def run_interpreter(self, source, **options):
+        outstream = StringIO.StringIO()
+        interpreter = Interpreter(StringIO.StringIO(source), outstream,
+                                  **options)
+        interpreter.run()
+        return outstream.getvalue()
+
+    def test_results_written_to_outstream(self):
+        self.assertEqual('3\nx\n', self.run_interpreter('(+ 1 2) (define x 1)'))
+
+    def test_display_in_order_with_results(self):
+        self.assertEqual('ab1\n', self.run_interpreter(
+            '(display "a") (display "b") 1'))
+
+    def test_block_flush(self):
+        outstream = StringIO.StringIO()
+        interpreter = Interpreter(StringIO.StringIO(''), outstream,
+                                  flush='block', buffer_size=100)
+        interpreter.output.write('1\n')
+        self.assertEqual('', outstream.getvalue())
+        interpreter.output.flush()
+        self.assertEqual('1\n', outstream.getvalue())
+
+    def test_line_flush(self):
+        outstream = StringIO.StringIO()
+        interpreter = Interpreter(StringIO.StringIO(''), outstream,
+                                  flush='line')
+        interpreter.output.write('1\n')
+        self.assertEqual('1\n', outstream.getvalue())
+
+    def test_unknown_flush_policy_throws_error(self):
+        self.assertRaises(ValueError, Interpreter, StringIO.StringIO(''),
+                          StringIO.StringIO(), flush='never')
+
+    def test_optimized_stream_respects_later_redefinition(self):
+        source = '(define (f) (+ 1 2)) (define (+ a b) (* a b)) (f)'
+        self.assertEqual('f\n+\n2\n',
+                         self.run_interpreter(source, optimize=True))
+
+    def test_results_flushed_before_waiting_for_input(self):
+        read_fd, write_fd = os.pipe()
+        instream = os.fdopen(read_fd, 'r')
+        outstream = StringIO.StringIO()
+        interpreter = Interpreter(instream, outstream, flush='block')
+        runner = threading.Thread(target=interpreter.run)
+        runner.daemon = True
+        runner.start()
+        try:
+            os.write(write_fd, '(+ 1 2)\n')
+            deadline = time.time() + 5
+            while not outstream.getvalue() and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual('3\n', outstream.getvalue())
+        finally:
+            os.close(write_fd)
+            runner.join(5)
+            instream.close()
+
+    def test_long_input(self):
+        source = ''.join('(+ %d 1)\n' % i for i in range(30000))
+        result = self.run_interpreter(source)
+        self.assertEqual(range(1, 30001), map(int, result.split()))
+
+
+class test_run_parallel(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_files(self, *sources):
+        files = []
+        for i, source in enumerate(sources):
+            filename = os.path.join(self.directory, 'file%d.scm' % i)
+            with open(filename, 'w') as f:
+                f.write(source)
+            files.append(filename)
+        return files
+
+    def run_files(self, files, options={}, image_file=None):
+        outstream = StringIO.StringIO()
+        errstream = StringIO.StringIO()
+        failed = run_parallel(files, 2, options, image_file=image_file,
+                              outstream=outstream, errstream=errstream)
+        return failed, outstream.getvalue(), errstream.getvalue()
+
+    def test_output_in_order(self):
+        files = self.write_files(*['(display "f") %d' % i for i in range(6)])
+        failed, output, errors = self.run_files(files)
+        self.assertEqual(0, failed)
+        self.assertEqual(''.join('f%d\n' % i for i in range(6)), output)
+        self.assertEqual('', errors)
+
+    def test_files_have_own_environment(self):
+        files = self.write_files('(define x 1) x', 'x')
+        failed, output, errors = self.run_files(files)
+        self.assertEqual(1, failed)
+        self.assertEqual('x\n1\n', output)
+        self.assertIn(files[1] + ' failed:', errors)
+        self.assertIn('SymbolError', errors)
+
+    def test_limit_exceeded(self):
+        files = self.write_files('(define (loop) (loop)) (loop)', '1')
+        failed, output, errors = self.run_files(
+            files, {'limits': Limits(max_steps=100)})
+        self.assertEqual(1, failed)
+        self.assertEqual('loop\n1\n', output)
+        self.assertEqual('%s failed:\nError: step limit 100 exceeded\n' %
+                         files[0], errors)
+
+    def test_image(self):
+        interpreter = Interpreter(
+            StringIO.StringIO('(define (f) (display "hi") 2)'),
+            StringIO.StringIO())
+        interpreter.run()
+        image_file = os.path.join(self.directory, 'image')
+        interpreter.save_image(image_file)
+        files = self.write_files('(f)', '(f)')
+        failed, output, errors = self.run_files(files, image_file=image_file)
+        self.assertEqual(0, failed)
+        self.assertEqual('hi2\nhi2\n', output)
+
+
+if __name__ == '__main__':
+    main()
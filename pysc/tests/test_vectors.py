@@ -0,0 +1,158 @@
+from fractions import Fraction
+from unittest import TestCase, main, skipIf
+from pysc.environment import Environment, Builtins, BuiltinProcedure, \
+    make_list
+from pysc import vectors
+from pysc.vectors import VectorBuiltins, numpy
+from pysc.tests import EvaluatorMixin, MachineMixin
+
+
+@skipIf(numpy is None, 'NumPy is not installed')
+class test_vector_builtins(TestCase):
+    def test_vector(self):
+        result = VectorBuiltins.vector([1, 2, 3])
+        self.assertIsInstance(result, vectors.Vector)
+        self.assertEqual('#(1 2 3)', repr(result))
+
+    def test_vector_of_whole_rational_products(self):
+        product = Builtins.multiply([Fraction(2, 3), 3])
+        self.assertEqual('#(2 2)', repr(VectorBuiltins.vector([2, product])))
+
+    def test_vector_of_non_numbers_throws_error(self):
+        self.assertRaises(TypeError, VectorBuiltins.vector, [1, 'a'])
+
+    def test_make_vector(self):
+        self.assertEqual('#(0 0)', repr(VectorBuiltins.make_vector([2])))
+        self.assertEqual('#(1.5 1.5)',
+                         repr(VectorBuiltins.make_vector([2, 1.5])))
+
+    def test_list_to_vector(self):
+        result = VectorBuiltins.list_to_vector([make_list([1, 2.5])])
+        self.assertEqual('#(1.0 2.5)', repr(result))
+
+    def test_vector_to_list(self):
+        result = VectorBuiltins.vector_to_list(
+            [VectorBuiltins.vector([1, 2])])
+        self.assertEqual('(1 2)', repr(result))
+
+    def test_vector_ref_returns_python_number(self):
+        result = VectorBuiltins.vector_ref([VectorBuiltins.vector([1, 2]), 1])
+        self.assertIs(int, type(result))
+        self.assertEqual(2, result)
+
+    def test_vector_sum(self):
+        self.assertEqual(6, VectorBuiltins.vector_sum(
+            [VectorBuiltins.vector([1, 2, 3])]))
+
+    def test_vector_dot(self):
+        v = VectorBuiltins.vector([1, 2, 3])
+        self.assertEqual(14, VectorBuiltins.vector_dot([v, v]))
+
+    def test_arithmetic_broadcasts(self):
+        v = VectorBuiltins.vector([1, 2, 3])
+        self.assertEqual('#(2 3 4)', repr(Builtins.add([v, 1])))
+        self.assertEqual('#(1 4 9)', repr(Builtins.multiply([v, v])))
+        self.assertEqual('#(False True True)',
+                         repr(Builtins.greater_than([v, 1])))
+
+    def test_rationals_made_inexact(self):
+        v = VectorBuiltins.vector([1, 2])
+        half = Fraction(1, 2)
+        self.assertEqual('#(1.5 2.5)', repr(Builtins.add([half, v])))
+        self.assertEqual('#(1.5 2.5)', repr(Builtins.add([v, half])))
+        self.assertEqual('#(0.5 1.0)', repr(Builtins.multiply([v, half])))
+        self.assertEqual('#(2.0 4.0)', repr(Builtins.divide([v, half])))
+        self.assertEqual('#(0.5 0.25)', repr(Builtins.divide([half, v])))
+        self.assertEqual('#(False True)', repr(Builtins.greater_than(
+            [v, Fraction(3, 2)])))
+
+    def test_division_is_inexact(self):
+        v = VectorBuiltins.vector([1, 2, 3])
+        self.assertEqual('#(0.5 1.0 1.5)', repr(Builtins.divide([v, 2])))
+        self.assertEqual('#(1.0 0.5)', repr(Builtins.divide(
+            [1, VectorBuiltins.vector([1, 2])])))
+        self.assertEqual('#(1.0 0.5)', repr(Builtins.divide(
+            [VectorBuiltins.vector([1, 2])])))
+
+    def test_vector_map_pure_builtin(self):
+        v = VectorBuiltins.vector([1, 2, 3])
+        add = BuiltinProcedure(Builtins.add, pure=True)
+        self.assertEqual('#(2 4 6)', repr(VectorBuiltins.vector_map(
+            [add, v, v])))
+
+    def test_vector_map_other_procedure(self):
+        v = VectorBuiltins.vector([1, 2, 3])
+        square = BuiltinProcedure(lambda x: x[0] * x[0])
+        self.assertEqual('#(1 4 9)', repr(VectorBuiltins.vector_map(
+            [square, v])))
+
+    def test_vector_map_builtin_not_taking_vectors(self):
+        v = VectorBuiltins.vector([0, 1])
+        not_ = BuiltinProcedure(Builtins.not_, pure=True)
+        self.assertEqual('#(True False)', repr(VectorBuiltins.vector_map(
+            [not_, v])))
+
+    def test_vector_map_conversions(self):
+        v = VectorBuiltins.vector([1, 2, 3])
+        namespace = Builtins.namespace()
+        self.assertEqual('#(1.0 2.0 3.0)', repr(VectorBuiltins.vector_map(
+            [namespace['exact->inexact'], v])))
+        self.assertEqual('#(1 2 3)', repr(VectorBuiltins.vector_map(
+            [namespace['numerator'], v])))
+        self.assertEqual('#(1 2)', repr(VectorBuiltins.vector_map(
+            [namespace['inexact->exact'], VectorBuiltins.vector([1.0, 2.0])])))
+
+    def test_vector_map_to_rationals_throws_error(self):
+        # Vectors only hold integers and floats
+        self.assertRaises(TypeError, VectorBuiltins.vector_map,
+                          [Builtins.namespace()['inexact->exact'],
+                           VectorBuiltins.vector([1.5, 2.5])])
+
+    def test_not_a_vector_throws_error(self):
+        self.assertRaises(TypeError, VectorBuiltins.vector_sum,
+                          [make_list([1])])
+
+
+@skipIf(numpy is None, 'NumPy is not installed')
+class test_vector_evaluation(EvaluatorMixin, TestCase):
+    def setUp(self):
+        self.evaluator = self.make_evaluator(
+            Environment(namespace=Builtins.namespace()))
+
+    def test_namespace(self):
+        self.assertIn('vector-dot', Builtins.namespace())
+
+    def test_kernel(self):
+        result = self.eval_string("""
+            (define (norm-squared v) (vector-dot v v))
+            (define v (- (* (make-vector 4 2) 3) (vector 1 2 3 4)))
+            (list v (norm-squared v) (vector-sum (vector-map abs v)))
+        """)
+        self.assertEqual('(#(5 4 3 2) 54 14)', repr(result))
+
+    def test_vector_map_scheme_procedure(self):
+        result = self.eval_string("""
+            (define (f x y) (if (> x y) x y))
+            (vector-map f (vector 1 5 3) (vector 4 2 6))
+        """)
+        self.assertEqual('#(4 5 6)', repr(result))
+
+
+class test_vector_evaluation_with_machine(MachineMixin,
+                                          test_vector_evaluation):
+
+    """Run the vector evaluation tests with a Machine."""
+
+
+class test_without_numpy(TestCase):
+    def test_namespace_empty(self):
+        saved = vectors.numpy
+        vectors.numpy = None
+        try:
+            self.assertEqual({}, vectors.namespace())
+        finally:
+            vectors.numpy = saved
+
+
+if __name__ == '__main__':
+    main()
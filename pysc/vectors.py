@@ -0,0 +1,171 @@
+"""Numeric vectors backed by NumPy arrays.
+
+NumPy is optional.  When it can't be imported, numpy is None and
+namespace() returns no bindings, so that the interpreter runs without
+vectors.
+
+Vectors are one dimensional arrays of numbers.  The arithmetic
+builtins work on them unchanged, since NumPy arrays broadcast the
+Python operators over their elements, so (+ v 1) or (* v w) compute
+whole vectors at once.  The reductions and vector-map run on whole
+arrays as well, instead of applying a procedure to one element at a
+time.
+
+"""
+
+from fractions import Fraction
+from environment import Builtins, BuiltinProcedure, Pair, make_list
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+if numpy is not None:
+    class Vector(numpy.ndarray):
+
+        """NumPy array written as a Scheme vector, #(1 2 3).
+
+        Arithmetic on a Vector returns a Vector, so results are
+        written the same way.  Rationals are made inexact first, as
+        NumPy would otherwise make a vector of Fraction objects.
+
+        """
+
+        def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+            inputs = [_ufunc_operand(x) for x in inputs]
+            if 'out' in kwargs:
+                kwargs['out'] = tuple(_ufunc_operand(x)
+                                      for x in kwargs['out'])
+            result = getattr(ufunc, method)(*inputs, **kwargs)
+            if isinstance(result, numpy.ndarray):
+                return result.view(Vector)
+            return result
+
+        def __repr__(self):
+            return '#(%s)' % ' '.join(repr(x) for x in self.tolist())
+
+        __str__ = __repr__
+
+
+# Functions of the builtins computing the whole vector at once when
+# given vectors.  Other builtins, even pure ones, may take only one
+# number, or return a vector unchanged.
+_BROADCASTING = frozenset([
+    Builtins.add, Builtins.subtract, Builtins.multiply, Builtins.divide,
+    Builtins.greater_than, Builtins.less_than, Builtins.equals,
+    Builtins.abs, Builtins.remainder])
+
+
+def _ufunc_operand(value):
+    if isinstance(value, Vector):
+        return value.view(numpy.ndarray)
+    elif value.__class__ is Fraction:
+        return float(value)
+    return value
+
+
+def make_vector(values):
+    """Return Vector of the numbers in sequence values."""
+
+    vector = numpy.array(values)
+    if vector.ndim != 1 or vector.dtype.kind not in 'biuf':
+        raise TypeError('vector elements must be numbers')
+    return vector.view(Vector)
+
+
+def _as_vector(value):
+    if not isinstance(value, Vector):
+        raise TypeError('not a vector: %r' % (value,))
+    return value
+
+
+class VectorBuiltins(object):
+    @classmethod
+    def make_vector(cls, operands):
+        if len(operands) > 1:
+            fill = operands[1]
+        else:
+            fill = 0
+        return make_vector(numpy.full(operands[0], fill))
+
+    @classmethod
+    def vector(cls, operands):
+        return make_vector(operands)
+
+    @classmethod
+    def list_to_vector(cls, operands):
+        values = []
+        rest = operands[0]
+        while rest.__class__ is Pair:
+            values.append(rest.car)
+            rest = rest.cdr
+        return make_vector(values)
+
+    @classmethod
+    def vector_to_list(cls, operands):
+        return make_list(_as_vector(operands[0]).tolist())
+
+    @classmethod
+    def is_vector(cls, operands):
+        return isinstance(operands[0], Vector)
+
+    @classmethod
+    def vector_length(cls, operands):
+        return len(_as_vector(operands[0]))
+
+    @classmethod
+    def vector_ref(cls, operands):
+        return _as_vector(operands[0]).item(operands[1])
+
+    @classmethod
+    def vector_sum(cls, operands):
+        return _as_vector(operands[0]).sum().item()
+
+    @classmethod
+    def vector_dot(cls, operands):
+        return numpy.dot(_as_vector(operands[0]),
+                         _as_vector(operands[1])).item()
+
+    @classmethod
+    def vector_map(cls, operands):
+        # Arithmetic builtins broadcast over whole vectors.  Anything
+        # else, or vectors of different lengths, are applied to one
+        # element at a time.
+        procedure = operands[0]
+        vectors = [_as_vector(x) for x in operands[1:]]
+        if isinstance(procedure, BuiltinProcedure) and \
+                procedure.function in _BROADCASTING:
+            try:
+                result = procedure.apply(None, vectors)
+            except ValueError:
+                pass
+            else:
+                if isinstance(result, Vector):
+                    return result
+        length = min(len(x) for x in vectors)
+        columns = [x.tolist() for x in vectors]
+        return make_vector([procedure.apply(None, [x[i] for x in columns])
+                            for i in xrange(length)])
+
+
+def namespace():
+    """Return dictionary of the vector builtins by name, or an empty
+    one if NumPy is not available."""
+
+    if numpy is None:
+        return {}
+    cls = VectorBuiltins
+    return {
+        'make-vector': BuiltinProcedure(cls.make_vector),
+        'vector': BuiltinProcedure(cls.vector),
+        'list->vector': BuiltinProcedure(cls.list_to_vector),
+        'vector->list': BuiltinProcedure(cls.vector_to_list),
+        'vector?': BuiltinProcedure(cls.is_vector),
+        'vector-length': BuiltinProcedure(cls.vector_length),
+        'vector-ref': BuiltinProcedure(cls.vector_ref),
+        'vector-sum': BuiltinProcedure(cls.vector_sum),
+        'vector-dot': BuiltinProcedure(cls.vector_dot),
+        'vector-map': BuiltinProcedure(cls.vector_map)
+    }